@@ -0,0 +1,150 @@
+# logging that never writes to disk from a request thread: records go to
+# a bounded in-memory queue and a QueueListener thread does the file I/O
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+from sqlalchemy import event
+
+ACCESS_LOGGER = 'fyyur.access'
+
+
+class JsonFormatter(logging.Formatter):
+    # one JSON object per line; structured fields come from extra={'fields': {...}}
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        data.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif getattr(record, 'exception_text', None):
+            # formatted by DroppingQueueHandler.prepare
+            data["exception"] = record.exception_text
+        return json.dumps(data, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    # never blocks the caller: when the queue is full the record is dropped
+    # and counted instead
+
+    dropped = 0
+
+    def prepare(self, record):
+        # QueueHandler.prepare formats the traceback into the message and
+        # drops exc_info; keep the message plain and the traceback in its
+        # own attribute so the JSON line gets an "exception" field
+        exception_text = None
+        if record.exc_info:
+            exception_text = logging.Formatter().formatException(
+                record.exc_info)
+        elif record.exc_text:
+            exception_text = record.exc_text
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.exception_text = exception_text
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def file_handler(directory, filename, max_bytes, backup_count):
+    handler = RotatingFileHandler(os.path.join(directory, filename),
+                                  maxBytes=max_bytes,
+                                  backupCount=backup_count)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def setup_logging(app):
+    # app.logger and the access logger both go through one queue to
+    # rotating JSON files in LOG_DIR
+    directory = app.config['LOG_DIR']
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    log_queue = queue.Queue(app.config['LOG_QUEUE_SIZE'])
+    max_bytes = app.config['LOG_MAX_BYTES']
+    backups = app.config['LOG_BACKUP_COUNT']
+
+    app_handler = file_handler(directory, 'app.log', max_bytes, backups)
+    app_handler.addFilter(lambda record: record.name != ACCESS_LOGGER)
+    access_handler = file_handler(directory, 'access.log', max_bytes, backups)
+    access_handler.addFilter(lambda record: record.name == ACCESS_LOGGER)
+    listener = QueueListener(log_queue, app_handler, access_handler,
+                             respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    handler = DroppingQueueHandler(log_queue)
+    # flask's own handler writes to stderr on the calling thread
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(handler)
+    app.logger.setLevel(logging.DEBUG if app.debug else logging.INFO)
+    access_logger = logging.getLogger(ACCESS_LOGGER)
+    access_logger.addHandler(handler)
+    access_logger.setLevel(logging.INFO)
+    access_logger.propagate = False
+    return listener
+
+
+def count_queries(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+
+
+def install_access_log(app):
+    # ACCESS_LOG_SAMPLING maps endpoint names to the share of requests
+    # logged, e.g. {'static': 0.0, 'autocomplete': 0.01}. errors (>= 500)
+    # are always logged
+    logger = logging.getLogger(ACCESS_LOGGER)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        g.query_count = 0
+
+    @app.after_request
+    def log_request(response):
+        sampling = app.config['ACCESS_LOG_SAMPLING'].get(
+            request.endpoint, app.config['ACCESS_LOG_DEFAULT_SAMPLING'])
+        if response.status_code < 500 and random.random() >= sampling:
+            return response
+        started = g.get('request_started')
+        logger.info('request', extra={'fields': {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2)
+            if started else None,
+            "queries": g.get('query_count', 0),
+            # asking a streamed response for its length would consume it
+            "bytes": None if response.is_streamed
+            else response.calculate_content_length(),
+            "remote_addr": request.remote_addr,
+            "sampling": sampling
+        }})
+        return response
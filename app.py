@@ -3,18 +3,47 @@
 #----------------------------------------------------------------------------#
 
 import json
+import hmac
+import re
+import tempfile
+import time
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import click
+import heapq
+from datetime import timedelta
+from functools import wraps
+from itertools import islice
+from sqlalchemy import func, union_all, select
+from sqlalchemy.orm import joinedload, lazyload, raiseload, selectinload, \
+    sessionmaker
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort, send_file, stream_with_context
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
 from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
-from extensions import csrf
-import sys
+from extensions import csrf, limiter, shards
+from recurrence import expand_occurrences, RecurrenceError
+from archive import archive_shows
+from autocomplete import PrefixIndex, IndexRefresher
+from export import iter_batches, iter_csv, write_parquet
+import pool_metrics
+import seed
+import query_plans
+from pagination import keyset_page, sort_key
+from projections import fetch, NamedItem, VenueListItem, ShowListItem
+from itertools import groupby
+from batch_writer import BatchWriter, FlushTimeout
+from search_cache import SearchCache, normalize_term
+from live_feed import Hub, HubFull, city_topic, venue_topic, stream
+from trending import HomePanels
+from profiling import install_profiler
+import duplicates
+import snapshots
+import rollups
+from access_log import setup_logging, install_access_log, count_queries
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -23,7 +52,42 @@ app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
 csrf.init_app(app)
-db = SQLAlchemy(app)
+limiter.init_app(app)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+    app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+    poolclass=pool_metrics.TimedQueuePool)
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    # pooled connections move between the request threads and the
+    # background ones (name refresher, home panels, show writer); the pool
+    # hands each one to a single thread at a time
+    app.config['SQLALCHEMY_ENGINE_OPTIONS']['connect_args'] = dict(
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('connect_args', {}),
+        check_same_thread=False)
+shards.init_app(app)
+
+
+class ShardRoutingSession(SignallingSession):
+    # inside shards.use(<shard>) every statement goes to that shard,
+    # otherwise to the main database as usual
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if shards.current is not None:
+            return shards.engine()
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+class ShardedSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return sessionmaker(class_=ShardRoutingSession, db=self, **options)
+
+
+db = ShardedSQLAlchemy(app)
+with app.app_context():
+    pool_stats = pool_metrics.instrument(db.engine)
+    count_queries(db.engine)
+shard_pool_stats = {}
+for group, shard_engine in shards.engines.items():
+    shard_pool_stats[group] = pool_metrics.instrument(shard_engine)
+    count_queries(shard_engine)
 
 migrate = Migrate(app, db)
 
@@ -31,12 +95,75 @@ migrate = Migrate(app, db)
 # Models.
 #----------------------------------------------------------------------------#
 
+# with RAISE_ON_LAZY_LOAD (on in debug) touching a relationship that the
+# query did not load raises instead of silently running another query
+RELATIONSHIP_LAZY = 'raise_on_sql' if app.config['RAISE_ON_LAZY_LOAD'] \
+    else 'select'
+
+RELATIONSHIP_LOADERS = {
+    'selectin': selectinload,
+    'joined': joinedload,
+    'lazy': lazyload,
+    'raise': raiseload,
+}
+
+
+def load_options(*strategies):
+    # loader options declaring everything a query loads, e.g.
+    #   Artist.query.options(*load_options((Artist.shows, 'selectin')))
+    # with RAISE_ON_LAZY_LOAD touching a relationship that is not listed
+    # raises, otherwise it is loaded lazily
+    options = [RELATIONSHIP_LOADERS[strategy](relationship)
+               for relationship, strategy in strategies]
+    if app.config['RAISE_ON_LAZY_LOAD']:
+        options.append(raiseload('*'))
+    return options
+
+
 Show = db.Table('Show', db.Model.metadata,
                 db.Column('Venue_id', db.Integer, db.ForeignKey('Venue.id')),
                 db.Column('Artist_id', db.Integer, db.ForeignKey('Artist.id')),
-                db.Column('start_time', db.DateTime)
+                db.Column('start_time', db.DateTime),
+                db.Column('created_at', db.DateTime,
+                          server_default=func.now()),
+                db.Index('ix_Show_start_time', 'start_time'),
+                db.Index('ix_Show_created_at', 'created_at'),
+                db.Index('ix_Show_venue_start', 'Venue_id', 'start_time'),
+                db.Index('ix_Show_artist_start', 'Artist_id', 'start_time')
                 )
 
+# shows older than ARCHIVE_HORIZON_DAYS, moved here by `flask archive-shows`
+ShowArchive = db.Table('ShowArchive', db.Model.metadata,
+                       db.Column('Venue_id', db.Integer,
+                                 db.ForeignKey('Venue.id')),
+                       db.Column('Artist_id', db.Integer,
+                                 db.ForeignKey('Artist.id')),
+                       db.Column('start_time', db.DateTime),
+                       db.Column('created_at', db.DateTime),
+                       db.Index('ix_ShowArchive_venue_start',
+                                'Venue_id', 'start_time'),
+                       db.Index('ix_ShowArchive_artist_start',
+                                'Artist_id', 'start_time')
+                       )
+
+# show counts for /stats, see rollups.py: per artist genre per month and
+# per venue city per week, live and archived shows alike
+ShowGenreMonth = db.Table('ShowGenreMonth', db.Model.metadata,
+                          db.Column('genre', db.String(120),
+                                    primary_key=True),
+                          db.Column('month', db.Date, primary_key=True),
+                          db.Column('shows', db.Integer, nullable=False),
+                          db.Index('ix_ShowGenreMonth_month', 'month')
+                          )
+
+ShowCityWeek = db.Table('ShowCityWeek', db.Model.metadata,
+                        db.Column('city', db.String(120), primary_key=True),
+                        db.Column('state', db.String(120), primary_key=True),
+                        db.Column('week', db.Date, primary_key=True),
+                        db.Column('shows', db.Integer, nullable=False),
+                        db.Index('ix_ShowCityWeek_week', 'week')
+                        )
+
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
@@ -53,8 +180,19 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
+    version = db.Column(db.Integer, nullable=False, default=1,
+                        server_default='1')
+    # duplicates.fingerprint(name, city, state)
+    fingerprint = db.Column(db.String(40))
+    # never loaded implicitly: routes pick a strategy with load_options()
     venues = db.relationship('Artist', secondary=Show,
-                             backref=db.backref('shows', lazy='joined'))
+                             lazy=RELATIONSHIP_LAZY,
+                             backref=db.backref('shows',
+                                                lazy=RELATIONSHIP_LAZY))
+
+    __table_args__ = (
+        db.Index('ix_Venue_fingerprint', 'fingerprint'),
+    )
 
 
 class Artist(db.Model):
@@ -71,10 +209,122 @@ class Artist(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
+    version = db.Column(db.Integer, nullable=False, default=1,
+                        server_default='1')
+    # duplicates.fingerprint(name, city, state)
+    fingerprint = db.Column(db.String(40))
+
+    # keyset pagination of /artists walks these in (sort key, id) order
+    __table_args__ = (
+        db.Index('ix_Artist_fingerprint', 'fingerprint'),
+        db.Index('ix_Artist_name_id', sort_key(name), id),
+        db.Index('ix_Artist_city_id', sort_key(city), id),
+        db.Index('ix_Artist_state_name_id', state, sort_key(name), id),
+        db.Index('ix_Artist_state_city_id', state, sort_key(city), id),
+    )
+
+
+# with sharding enabled (SHARD_BINDS), venue ids are allocated here in the
+# main database and each venue is looked up here to find its shard
+class VenueDirectory(db.Model):
+    __tablename__ = 'VenueDirectory'
+
+    id = db.Column(db.Integer, primary_key=True)
+    shard = db.Column(db.String(40), nullable=False)
 
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
+#----------------------------------------------------------------------------#
+# Shards.
+#----------------------------------------------------------------------------#
+
+# each shard holds the venues of its states with their shows and archive,
+# plus a copy of every artist so shows can be joined inside the shard.
+# without SHARD_BINDS all of these are no-ops on the main database
+
+
+def venue_shards(venue_ids):
+    # {venue id: shard} for the venues that exist
+    with shards.use(None):
+        return dict(db.session.query(VenueDirectory.id, VenueDirectory.shard).
+                    filter(VenueDirectory.id.in_(set(venue_ids))).all())
+
+
+def allocate_venue_id(state):
+    # reserves a venue id for a new venue and records its shard
+    entry = VenueDirectory(shard=shards.group_for_state(state))
+    with shards.use(None):
+        db.session.add(entry)
+        db.session.commit()
+        return entry.id, entry.shard
+
+
+def release_venue_id(venue_id):
+    # drops the directory entry of a venue whose insert on its shard failed
+    with db.engine.begin() as connection:
+        connection.execute(VenueDirectory.__table__.delete().
+                           where(VenueDirectory.id == venue_id))
+
+
+def routes_to_venue_shard(view):
+    # runs a view taking venue_id against that venue's shard
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not shards.enabled:
+            return view(*args, **kwargs)
+        group = venue_shards([kwargs['venue_id']]).get(kwargs['venue_id'])
+        if group is None:
+            abort(404)
+        db.session.close()
+        with shards.use(group):
+            try:
+                return view(*args, **kwargs)
+            finally:
+                db.session.close()
+    return wrapper
+
+
+def on_all_shards(function, key=None, reverse=False):
+    # scatter-gather of a list-returning read: with sharding function runs
+    # once per shard in parallel and the lists are merged in <key> order
+    # (each must already be sorted by it), otherwise it just runs here
+    if not shards.enabled:
+        return function()
+    return shards.gather(app, function, key=key, reverse=reverse,
+                         cleanup=db.session.remove)
+
+
+def replicate_artist(artist_id):
+    # copies an artist row from the main database to every shard after it
+    # was created or edited there
+    if not shards.enabled:
+        return
+    row = db.session.execute(Artist.__table__.select().
+                             where(Artist.id == artist_id)).first()
+    for group in shards.groups:
+        with shards.engines[group].begin() as connection:
+            connection.execute(Artist.__table__.delete().
+                               where(Artist.id == artist_id))
+            connection.execute(Artist.__table__.insert(), [dict(row)])
+
+
+@app.cli.command('init-shards')
+def init_shards_command():
+    """Create the schema on every shard and copy the artists there."""
+    if not shards.enabled:
+        raise click.UsageError('no shards configured (FYYUR_SHARDS)')
+    artists = [dict(row) for row in
+               db.session.execute(Artist.__table__.select())]
+    for group in shards.groups:
+        db.Model.metadata.create_all(shards.engines[group])
+        with shards.engines[group].begin() as connection:
+            connection.execute(Artist.__table__.delete())
+            if artists:
+                connection.execute(Artist.__table__.insert(), artists)
+        click.echo('%s: schema ready, %d artists copied' %
+                   (group, len(artists)))
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
@@ -91,6 +341,159 @@ def format_datetime(value, format='medium'):
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Name index.
+#----------------------------------------------------------------------------#
+
+name_indexes = {
+    'venue': PrefixIndex(),
+    'artist': PrefixIndex()
+}
+
+
+search_cache = SearchCache(max_bytes=app.config['SEARCH_CACHE_MAX_BYTES'],
+                           ttl=app.config['SEARCH_CACHE_TTL'])
+
+
+def catalog_name_changed(kind, record_id, name, old_name=None):
+    # called after a venue/artist is created or renamed and committed
+    name_indexes[kind].add(record_id, name)
+    search_cache.invalidate(kind, name, old_name)
+    if old_name is None:
+        home_panels.listed(kind, record_id, name)
+    else:
+        home_panels.renamed(kind, record_id, name)
+
+
+def search_names(kind, model, term):
+    # case-insensitive substring search over names, answered from the
+    # search cache when possible. % and _ in the term match literally
+    term = normalize_term(term)
+    results = search_cache.get(kind, term)
+    if results is None:
+        pattern = term.replace('\\', '\\\\').replace('%', '\\%').\
+            replace('_', '\\_')
+        def find():
+            return fetch(db.session, NamedItem, select([
+                model.id, model.name
+            ]).where(model.name.ilike('%' + pattern + '%', escape='\\')))
+        results = tuple(on_all_shards(find) if kind == 'venue' else find())
+        search_cache.put(kind, term, results)
+    return results
+
+
+def load_home_panels():
+    # exact panel contents from the database, see trending.HomePanels.
+    # runs on the panels' own thread, so the session removed here is that
+    # thread's and never a request's
+    size = app.config['HOME_PANEL_SIZE']
+    capacity = home_panels.busiest_venues.capacity
+    with app.app_context():
+        try:
+            def recent_venues():
+                return db.session.query(Venue.id, Venue.name).\
+                    order_by(Venue.id.desc()).limit(size).all()
+
+            def busiest_venues():
+                upcoming = func.count().label('upcoming')
+                return db.session.query(Venue.id, Venue.name, upcoming).\
+                    join(Show, Show.c.Venue_id == Venue.id).\
+                    filter(Show.c.start_time > datetime.now()).\
+                    group_by(Venue.id, Venue.name).\
+                    order_by(upcoming.desc()).\
+                    limit(capacity).all()
+            venues = on_all_shards(recent_venues, key=lambda venue: venue.id,
+                                   reverse=True)[:size]
+            artists = db.session.query(Artist.id, Artist.name).\
+                order_by(Artist.id.desc()).limit(size).all()
+            counts = on_all_shards(busiest_venues)
+            return ([tuple(venue) for venue in venues],
+                    [tuple(artist) for artist in artists],
+                    [tuple(count) for count in counts])
+        finally:
+            db.session.remove()
+
+
+home_panels = HomePanels(load_home_panels,
+                         size=app.config['HOME_PANEL_SIZE'],
+                         interval=app.config['HOME_PANEL_REBUILD_SECONDS'])
+
+
+def read_names(kind):
+    # (id, name) of every venue or artist
+    model = Venue if kind == 'venue' else Artist
+
+    def names():
+        return db.session.query(model.id, model.name).all()
+    return on_all_shards(names) if kind == 'venue' else names()
+
+
+def refresh_names(kind):
+    # read_names on the refresher's own thread
+    with app.app_context():
+        try:
+            return read_names(kind)
+        finally:
+            db.session.remove()
+
+
+name_refresher = IndexRefresher(
+    name_indexes, refresh_names,
+    interval=app.config['AUTOCOMPLETE_RELOAD_SECONDS'])
+
+
+@app.before_first_request
+def start_name_refresher():
+    # gunicorn workers start it before their first request, see
+    # gunicorn_config.post_worker_init
+    name_refresher.start()
+
+
+def name_index(kind):
+    # the refresher loads the index at startup and reloads it periodically,
+    # the create and edit routes update it in between. only a request that
+    # beats the first load reads the names itself
+    index = name_indexes[kind]
+    if not index.loaded:
+        index.reload(lambda: read_names(kind))
+    return index
+
+
+#----------------------------------------------------------------------------#
+# Snapshots.
+#----------------------------------------------------------------------------#
+
+# endpoints `flask snapshot` renders to static files, see snapshots.py
+SNAPSHOT_ENDPOINTS = ('show_venue', 'show_artist', 'venues', 'artists',
+                      'shows')
+
+snapshot_regenerator = snapshots.Regenerator(
+    app, app.config['SNAPSHOT_DIR'], delay=app.config['SNAPSHOT_DELAY']) \
+    if app.config['SNAPSHOT_DIR'] else None
+
+
+def pages_changed(*paths):
+    # called after a commit with the pages it made stale
+    if snapshot_regenerator is not None:
+        snapshot_regenerator.changed(paths)
+
+
+def show_partner_pages(owner_key, owner_id):
+    # pages of the artists a venue has shows with, or the other way round
+    partner_key = 'Artist_id' if owner_key == 'Venue_id' else 'Venue_id'
+    prefix = '/artists/%d' if owner_key == 'Venue_id' else '/venues/%d'
+
+    def partner_ids():
+        return [row[0] for row in db.session.execute(union_all(
+            select([Show.c[partner_key]]).
+            where(Show.c[owner_key] == owner_id),
+            select([ShowArchive.c[partner_key]]).
+            where(ShowArchive.c[owner_key] == owner_id)))]
+    ids = partner_ids() if shards.current is not None \
+        else on_all_shards(partner_ids)
+    return [prefix % partner_id for partner_id in set(ids)]
+
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -98,7 +501,7 @@ app.jinja_env.filters['datetime'] = format_datetime
 
 @app.route('/')
 def index():
-    return render_template('pages/home.html')
+    return render_template('pages/home.html', panels=home_panels.snapshot())
 
 
 #  Venues
@@ -106,26 +509,34 @@ def index():
 
 @app.route('/venues')
 def venues():
+    # one query for all venues (per shard), grouped by city in python
+    def venue_list_rows():
+        return fetch(db.session, VenueListItem, select([
+            Venue.id, Venue.name, Venue.city, Venue.state
+        ]).order_by(Venue.state, Venue.city, Venue.name))
+    venue_list = on_all_shards(venue_list_rows, key=lambda venue: (
+        venue.state or '', venue.city or '', venue.name or ''))
     data = []
-    venue_list = Venue.query.distinct('state', 'city').all()
-    for venue in venue_list:
+    for (state, city), area_venues in groupby(
+            venue_list, key=lambda venue: (venue.state, venue.city)):
         venue_data = {
-            "city": venue.city,
-            "state": venue.state,
-            "venues": Venue.query.filter_by(city=venue.city).all()
+            "city": city,
+            "state": state,
+            "venues": list(area_venues)
         }
         data.append(venue_data)
     return render_template('pages/venues.html', areas=data)
 
 
 @app.route('/venues/search', methods=['POST'])
+@csrf.exempt
+@limiter.limit('venue_search')
 def search_venues():
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
     searched_term = request.form.get('search_term', '')
 
-    result_venues = Venue.query.filter(
-        Venue.name.ilike("%" + searched_term + "%")).all()
+    result_venues = search_names('venue', Venue, searched_term)
     count_venues = len(result_venues)
 
     response = {
@@ -135,20 +546,61 @@ def search_venues():
     return render_template('pages/search_venues.html', results=response, search_term=searched_term.lower())
 
 
+def past_shows_rows(owner_key, owner_id, partner, limit, offset):
+    # past shows of a venue or artist, most recent first. recent ones still
+    # live in the hot Show table, older ones in ShowArchive, so both are
+    # read and paginated together. returns (rows, total count)
+    partner_key = 'Artist_id' if owner_key == 'Venue_id' else 'Venue_id'
+    hot = select([Show.c[partner_key].label('partner_id'),
+                  Show.c.start_time]).\
+        where(Show.c[owner_key] == owner_id).\
+        where(Show.c.start_time <= datetime.now())
+    cold = select([ShowArchive.c[partner_key].label('partner_id'),
+                   ShowArchive.c.start_time]).\
+        where(ShowArchive.c[owner_key] == owner_id)
+    past = union_all(hot, cold).alias('past_shows')
+    count = db.session.query(func.count()).select_from(past).scalar()
+    rows = db.session.query(
+        partner.id, partner.name, partner.image_link, past.c.start_time).\
+        join(past, past.c.partner_id == partner.id).\
+        order_by(past.c.start_time.desc()).\
+        limit(limit).\
+        offset(offset).\
+        all()
+    return rows, count
+
+
+def past_shows_page(owner_key, owner_id, partner, page):
+    per_page = app.config['PAST_SHOWS_PER_PAGE']
+    if not shards.enabled or shards.current is not None:
+        return past_shows_rows(owner_key, owner_id, partner,
+                               per_page, (page - 1) * per_page)
+    # an artist's shows are spread over the shards: take the first <page>
+    # pages from each and cut the page out of the merged rows
+    pages = shards.scatter(app, lambda: past_shows_rows(
+        owner_key, owner_id, partner, page * per_page, 0),
+        cleanup=db.session.remove)
+    rows = heapq.merge(*[shard_rows for shard_rows, _ in pages],
+                       key=lambda row: row.start_time, reverse=True)
+    return (list(islice(rows, (page - 1) * per_page, page * per_page)),
+            sum(count for _, count in pages))
+
+
+def page_count(count):
+    per_page = app.config['PAST_SHOWS_PER_PAGE']
+    return max(1, (count + per_page - 1) // per_page)
+
+
 @app.route('/venues/<int:venue_id>', methods=['GET'])
+@routes_to_venue_shard
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
-    venue = Venue.query.filter_by(id=venue_id).first()
+    venue = Venue.query.options(*load_options()).\
+        filter_by(id=venue_id).first_or_404()
+    past_page = max(1, request.args.get('past_page', 1, type=int))
 
-    old_shows = db.session.query(
-        Artist.id.label("artist_id"),
-        Artist.name.label("artist_name"),
-        Artist.image_link.label("artist_image_link"),
-        Show).\
-        filter(Show.c.Venue_id == venue_id).\
-        filter(Show.c.Artist_id == Artist.id).\
-        filter(Show.c.start_time <= datetime.now()).\
-        all()
+    old_shows, past_shows_count = past_shows_page(
+        'Venue_id', venue_id, Artist, past_page)
     old_shows_todisplay = []
     for old_show in old_shows:
         previous_show = {
@@ -194,8 +646,10 @@ def show_venue(venue_id):
         "image_link": venue.image_link,
         "past_shows": old_shows_todisplay,
         "upcoming_shows": futur_shows_todisplay,
-        "past_shows_count": len(old_shows_todisplay),
-        "upcoming_shows_count": len(futur_shows_todisplay)
+        "past_shows_count": past_shows_count,
+        "upcoming_shows_count": len(futur_shows_todisplay),
+        "past_page": past_page,
+        "past_pages": page_count(past_shows_count)
     }
     return render_template('pages/show_venue.html', venue=data)
 
@@ -225,6 +679,14 @@ def create_venue_submission():
             image_link = form.image_link.data
             genres = ','.join(form.genres.data)
             facebook_link = request.form.get('facebook_link')
+            fingerprint = duplicates.fingerprint(name, city, state)
+            with shards.use(shards.group_for_state(state)):
+                duplicate = Venue.query.options(*load_options()).\
+                    filter_by(fingerprint=fingerprint).first()
+            if duplicate is not None:
+                flash('Venue ' + duplicate.name + ' in ' + duplicate.city +
+                      ' is already listed.')
+                return render_template('pages/home.html')
             venue = Venue(name=name,
                           city=city,
                           state=state,
@@ -233,21 +695,39 @@ def create_venue_submission():
                           website=website,
                           image_link=image_link,
                           genres=genres,
-                          facebook_link=facebook_link
+                          facebook_link=facebook_link,
+                          fingerprint=fingerprint
                           )
-            db.session.add(venue)
-            db.session.commit()
+            group = None
+            if shards.enabled:
+                venue.id, group = allocate_venue_id(state)
+            with shards.use(group):
+                db.session.add(venue)
+                try:
+                    db.session.commit()
+                except:
+                    db.session.rollback()
+                    if group is not None:
+                        release_venue_id(venue.id)
+                    raise
+                venue_id = venue.id
             # on successful db insert, flash success
             flash('Venue ' + request.form['name'] +
                   ' was successfully listed!')
+        except PoolTimeoutError:
+            raise
         except:
             flash('An error occurred. Venue ' +
-                  data.name + ' could not be listed.')
+                  request.form['name'] + ' could not be listed.')
             error = True
             db.session.rollback()
-            print(sys.exc_info())
+            app.logger.exception('%s failed', request.endpoint)
         finally:
             db.session.close()
+        if not error:
+            # the venue is committed: these only refresh derived data
+            catalog_name_changed('venue', venue_id, name)
+            pages_changed('/venues/%d' % venue_id, '/venues')
     else:
         flash(form.errors)  # Flashes reason, why form is unsuccessful
     return render_template('pages/home.html')
@@ -268,20 +748,48 @@ def create_venue_submission():
 
 #  Artists
 #  ----------------------------------------------------------------
+ARTIST_SORTS = {
+    'name': Artist.name,
+    'city': Artist.city,
+}
+
+
 @app.route('/artists')
 def artists():
-    data = Artist.query.all()
-    return render_template('pages/artists.html', artists=data)
+    # one keyset page of artists: ?sort=name|city&state=XX&after=|before=
+    # only the columns the listing shows are selected
+    sort = request.args.get('sort', 'name')
+    if sort not in ARTIST_SORTS:
+        sort = 'name'
+    state = request.args.get('state') or None
+    sort_column = ARTIST_SORTS[sort]
+    columns = [Artist.id, Artist.name]
+    if sort_column is not Artist.name:
+        columns.append(sort_column)
+    query = db.session.query(*columns)
+    if state:
+        query = query.filter(Artist.state == state)
+    try:
+        page = keyset_page(query, sort_column, Artist.id,
+                           app.config['ARTISTS_PER_PAGE'],
+                           after=request.args.get('after'),
+                           before=request.args.get('before'))
+    except ValueError:
+        abort(400)
+    return render_template('pages/artists.html', artists=page.items,
+                           page=page, sort=sort, state=state,
+                           states=STATE_CHOICES)
 
 
 @app.route('/artists/search', methods=['POST'])
+@csrf.exempt
+@limiter.limit('artist_search')
 def search_artists():
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
     searched_term = request.form.get('search_term', '')
 
-    result_artists = Artist.query.filter(
-        Artist.name.ilike("%" + searched_term + "%")).all()
+    result_artists = search_names('artist', Artist, searched_term)
     count_artists = len(result_artists)
 
     response = {
@@ -295,17 +803,12 @@ def search_artists():
 def show_artist(artist_id):
     # shows the venue page with the given venue_id
     # get the past and futur show to display. get the count show too
-    artist = Artist.query.filter_by(id=artist_id).first()
+    artist = Artist.query.options(*load_options()).\
+        filter_by(id=artist_id).first_or_404()
+    past_page = max(1, request.args.get('past_page', 1, type=int))
 
-    old_shows = db.session.query(
-        Venue.id.label("venue_id"),
-        Venue.name.label("venue_name"),
-        Venue.image_link.label("venue_image_link"),
-        Show).\
-        filter(Show.c.Artist_id == artist_id).\
-        filter(Show.c.Venue_id == Venue.id).\
-        filter(Show.c.start_time <= datetime.now()).\
-        all()
+    old_shows, past_shows_count = past_shows_page(
+        'Artist_id', artist_id, Venue, past_page)
 
     old_shows_todisplay = []
 
@@ -318,15 +821,19 @@ def show_artist(artist_id):
         }
         old_shows_todisplay.append(old_show_todisplay)
 
-    future_shows = db.session.query(
-        Artist.id.label("artist_id"),
-        Artist.name.label("artist_name"),
-        Artist.image_link.label("artist_image_link"),
-        Show).\
-        filter(Show.c.Venue_id == Venue.id).\
-        filter(Show.c.Artist_id == Artist.id).\
-        filter(Show.c.start_time > datetime.now()).\
-        all()
+    def upcoming_shows():
+        return db.session.query(
+            Venue.id.label("venue_id"),
+            Venue.name.label("venue_name"),
+            Venue.image_link.label("venue_image_link"),
+            Show).\
+            filter(Show.c.Artist_id == artist_id).\
+            filter(Show.c.Venue_id == Venue.id).\
+            filter(Show.c.start_time > datetime.now()).\
+            order_by(Show.c.start_time).\
+            all()
+    future_shows = on_all_shards(upcoming_shows,
+                                 key=lambda show: show.start_time)
 
     futur_shows_todisplay = []
 
@@ -353,84 +860,175 @@ def show_artist(artist_id):
         "image_link": artist.image_link,
         "past_shows": old_shows_todisplay,
         "upcoming_shows": futur_shows_todisplay,
-        "past_shows_count": len(old_shows_todisplay),
-        "upcoming_shows_count": len(futur_shows_todisplay)
-
+        "past_shows_count": past_shows_count,
+        "upcoming_shows_count": len(futur_shows_todisplay),
+        "past_page": past_page,
+        "past_pages": page_count(past_shows_count)
     }
     return render_template('pages/show_artist.html', artist=data)
 
 #  Update
 #  ----------------------------------------------------------------
+
+ARTIST_EDIT_COLUMNS = ('name', 'city', 'state', 'phone', 'website',
+                       'image_link', 'genres', 'facebook_link')
+VENUE_EDIT_COLUMNS = ARTIST_EDIT_COLUMNS + ('address',)
+
+
+def changed_columns(record, form, columns):
+    # diff the submitted form against the stored row.
+    # blank fields are treated as "not submitted" and leave the column alone
+    changes = {}
+    for column in columns:
+        value = getattr(form, column).data
+        stored = getattr(record, column)
+        if isinstance(value, list):
+            # the select submits genres in option order, not stored order
+            if set(value) == set((stored or '').split(',')):
+                continue
+            value = ','.join(value)
+        if value is None or value == '':
+            continue
+        if stored != value:
+            changes[column] = value
+    if set(changes) & set(('name', 'city', 'state')):
+        changes['fingerprint'] = duplicates.fingerprint(
+            *[changes.get(column, getattr(record, column))
+              for column in ('name', 'city', 'state')])
+    return changes
+
+
+def update_changed_columns(model, record_id, version, changes):
+    # single UPDATE of the changed columns, guarded by the version the
+    # editor loaded. returns False when another edit got there first
+    statement = model.__table__.update().\
+        where(model.id == record_id).\
+        where(model.version == version).\
+        values(version=model.version + 1, **changes)
+    return db.session.execute(statement).rowcount == 1
+
+
+def edit_form(form_class, record):
+    # the form filled with the stored row, so an untouched submit changes
+    # nothing. genres are stored comma separated
+    form = form_class(obj=record)
+    form.genres.data = [genre for genre in (record.genres or '').split(',')
+                        if genre]
+    return form
+
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-    form = ArtistForm()
-    artist = Artist.query.get(artist_id)
-    return render_template('forms/edit_artist.html', form=form, artist=artist)
+    artist = Artist.query.options(*load_options()).get_or_404(artist_id)
+    form = edit_form(ArtistForm, artist)
+    return render_template('forms/edit_artist.html', form=form, artist=artist,
+                           version=artist.version)
 
 
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     # artist record with ID <artist_id> using the new attributes
-    error = False
-    artist = Artist.query.get(artist_id)
+    # only the columns that differ from the stored row are written
+    form = ArtistForm(request.form)
+    artist = Artist.query.options(*load_options()).get_or_404(artist_id)
+    # the version the editor loaded, kept across a failed validation so a
+    # corrected resubmit is still checked against it
+    version = request.form.get('version', artist.version, type=int)
+    if not form.validate():
+        flash(form.errors)  # Flashes reason, why form is unsuccessful
+        return render_template('forms/edit_artist.html', form=form,
+                               artist=artist, version=version)
+    changes = changed_columns(artist, form, ARTIST_EDIT_COLUMNS)
+    if not changes:
+        flash('No changes to save for artist ' + artist.name + '.')
+        return redirect(url_for('show_artist', artist_id=artist_id))
+    old_name = artist.name
     try:
-        artist.name = request.form.get('name')
-        artist.city = request.form.get('city')
-        artist.state = request.form.get('state')
-        artist.phone = request.form.get('phone')
-        artist.website = request.form.get('website')
-        artist.image_link = request.form.get('image_link')
-        artist.genres = request.form.get('genres')
-        artist.facebook_link = request.form.get('facebook_link')
-        db.session.commit()
+        if update_changed_columns(Artist, artist_id, version, changes):
+            db.session.commit()
+            replicate_artist(artist_id)
+            if 'name' in changes:
+                catalog_name_changed('artist', artist_id, changes['name'],
+                                     old_name)
+            pages = ['/artists/%d' % artist_id, '/artists']
+            if 'name' in changes or 'image_link' in changes:
+                pages += ['/shows'] + show_partner_pages('Artist_id',
+                                                         artist_id)
+            pages_changed(*pages)
+            flash('Artist ' + changes.get('name', artist.name) +
+                  ' was successfully edited!')
+        else:
+            db.session.rollback()
+            flash('Artist ' + artist.name +
+                  ' was changed by someone else, please reload and try again.')
+    except PoolTimeoutError:
+        raise
     except:
         flash('An error occurred. Artist ' +
-              artist.name + ' could not be listed.')
-        error = True
+              artist.name + ' could not be edited.')
         db.session.rollback()
-        print(sys.exc_info())
-    # on successful db insert, flash success
+        app.logger.exception('%s failed', request.endpoint)
     finally:
-        # on successful db insert, flash success
-        flash('Artist ' + request.form['name'] + ' was successfully edited!')
         db.session.close()
     return redirect(url_for('show_artist', artist_id=artist_id))
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@routes_to_venue_shard
 def edit_venue(venue_id):
-    form = VenueForm()
-    venue = Venue.query.get(venue_id)
-    return render_template('forms/edit_venue.html', form=form, venue=venue)
+    venue = Venue.query.options(*load_options()).get_or_404(venue_id)
+    form = edit_form(VenueForm, venue)
+    return render_template('forms/edit_venue.html', form=form, venue=venue,
+                           version=venue.version)
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@routes_to_venue_shard
 def edit_venue_submission(venue_id):
     # venue record with ID <venue_id> using the new attributes
-    # get past, futur and count show to display on client
-    error = False
-    venue = Venue.query.get(venue_id)
+    # only the columns that differ from the stored row are written
+    form = VenueForm(request.form)
+    venue = Venue.query.options(*load_options()).get_or_404(venue_id)
+    # the version the editor loaded, kept across a failed validation so a
+    # corrected resubmit is still checked against it
+    version = request.form.get('version', venue.version, type=int)
+    if not form.validate():
+        flash(form.errors)  # Flashes reason, why form is unsuccessful
+        return render_template('forms/edit_venue.html', form=form,
+                               venue=venue, version=version)
+    changes = changed_columns(venue, form, VENUE_EDIT_COLUMNS)
+    if not changes:
+        flash('No changes to save for venue ' + venue.name + '.')
+        return redirect(url_for('show_venue', venue_id=venue_id))
+    if 'state' in changes and shards.enabled and \
+            shards.group_for_state(changes['state']) != shards.current:
+        flash('Venue ' + venue.name + ' cannot move to ' + changes['state'] +
+              ', it is stored with the venues of another group of states.')
+        return redirect(url_for('show_venue', venue_id=venue_id))
+    old_name = venue.name
     try:
-        venue.name = request.form.get('name')
-        venue.city = request.form.get('city')
-        venue.state = request.form.get('state')
-        venue.address = request.form.get('address')
-        venue.phone = request.form.get('phone')
-        venue.website = request.form.get('website')
-        venue.image_link = request.form.get('image_link')
-        venue.genres = request.form.get('genres')
-        venue.facebook_link = request.form.get('facebook_link')
-        db.session.commit()
+        if update_changed_columns(Venue, venue_id, version, changes):
+            db.session.commit()
+            if 'name' in changes:
+                catalog_name_changed('venue', venue_id, changes['name'],
+                                     old_name)
+            pages = ['/venues/%d' % venue_id, '/venues']
+            if 'name' in changes or 'image_link' in changes:
+                pages += ['/shows'] + show_partner_pages('Venue_id', venue_id)
+            pages_changed(*pages)
+            flash('Venue ' + changes.get('name', venue.name) +
+                  ' was successfully edited!')
+        else:
+            db.session.rollback()
+            flash('Venue ' + venue.name +
+                  ' was changed by someone else, please reload and try again.')
+    except PoolTimeoutError:
+        raise
     except:
         flash('An error occurred. Venue ' +
-              request.form['name'] + ' could not be listed.')
-        error = True
+              venue.name + ' could not be edited.')
         db.session.rollback()
-        print(sys.exc_info())
-    # on successful db insert, flash success
+        app.logger.exception('%s failed', request.endpoint)
     finally:
-        # on successful db insert, flash success
-        flash('Venue ' + request.form['name'] + ' was successfully edited!')
         db.session.close()
     return redirect(url_for('show_venue', venue_id=venue_id))
 
@@ -460,6 +1058,13 @@ def create_artist_submission():
             image_link = form.name.data
             genres = ','.join(form.genres.data)
             facebook_link = form.facebook_link.data
+            fingerprint = duplicates.fingerprint(name, city, state)
+            duplicate = Artist.query.options(*load_options()).\
+                filter_by(fingerprint=fingerprint).first()
+            if duplicate is not None:
+                flash('Artist ' + duplicate.name + ' from ' + duplicate.city +
+                      ' is already listed.')
+                return render_template('pages/home.html')
             artist = Artist(name=name,
                             city=city,
                             state=state,
@@ -467,49 +1072,101 @@ def create_artist_submission():
                             website=website,
                             image_link=image_link,
                             genres=genres,
-                            facebook_link=facebook_link
+                            facebook_link=facebook_link,
+                            fingerprint=fingerprint
                             )
             db.session.add(artist)
             db.session.commit()
+            artist_id = artist.id
+            replicate_artist(artist_id)
             flash('Artist ' + request.form['name'] +
                   ' was successfully listed!')
+        except PoolTimeoutError:
+            raise
         except:
             flash('An error occurred. Artist ' +
                   request.form['name'] + ' could not be listed.')
             error = True
             db.session.rollback()
-            print(sys.exc_info())
+            app.logger.exception('%s failed', request.endpoint)
         # on successful db insert, flash success
         finally:
             # on successful db insert, flash success
             db.session.close()
+        if not error:
+            # the artist is committed: these only refresh derived data
+            catalog_name_changed('artist', artist_id, name)
+            pages_changed('/artists/%d' % artist_id, '/artists')
     else:
         flash(form.errors)  # Flashes reason, why form is unsuccessful
     return render_template('pages/home.html')
 
 
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+@app.route('/autocomplete')
+def autocomplete():
+    # ?type=venue|artist&q=<prefix>&limit=<n>, answered from memory
+    kind = request.args.get('type', 'venue')
+    if kind not in name_indexes:
+        return jsonify({"error": "type must be venue or artist"}), 400
+    limit = min(request.args.get('limit', app.config['AUTOCOMPLETE_LIMIT'],
+                                 type=int),
+                app.config['AUTOCOMPLETE_LIMIT'])
+    matches = name_index(kind).search(request.args.get('q', ''), limit)
+    return jsonify([{"id": record_id, "name": name}
+                    for record_id, name in matches])
+
+
 #  Shows
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
 def shows():
     # displays list of shows at /shows
-    shows = db.session.query(Show).all()
+    def show_list_rows():
+        return fetch(db.session, ShowListItem, select([
+            Venue.id, Venue.name, Artist.id, Artist.name, Artist.image_link,
+            Show.c.start_time
+        ]).select_from(
+            Show.join(Venue, Venue.id == Show.c.Venue_id).
+            join(Artist, Artist.id == Show.c.Artist_id)
+        ).order_by(Show.c.start_time))
+    show_list = on_all_shards(show_list_rows,
+                              key=lambda show: show.start_time)
     data = []
-    for show in shows:
-        dataTmp = {
-            "venue_id": Venue.query.filter_by(id=Show.c.Venue_id).first().id,
-            "venue_name": Venue.query.filter_by(id=Show.c.Venue_id).first().name,
-            "artist_id": Artist.query.filter_by(id=Show.c.Artist_id).first().id,
-            "artist_name": Artist.query.filter_by(id=Show.c.Artist_id).first().name,
-            "artist_image_link": Artist.query.filter_by(id=Show.c.Artist_id).first().image_link,
-            "start_time": show.start_time.strftime("%m/%d/%Y, %H:%M:%S")
-        }
-        data.append(dataTmp)
+    for show in show_list:
+        data.append(show._replace(
+            start_time=show.start_time.strftime("%m/%d/%Y, %H:%M:%S")))
 
     return render_template('pages/shows.html', shows=data)
 
 
+@app.route('/shows/stream')
+def shows_stream():
+    # server-sent events for newly booked upcoming shows, all of them or
+    # only those of ?city=<name> and/or ?venue_id=<id> (both repeatable)
+    try:
+        topics = [city_topic(city) for city in request.args.getlist('city')]
+        topics += [venue_topic(venue_id)
+                   for venue_id in request.args.getlist('venue_id')]
+    except ValueError:
+        return jsonify({"error": "venue_id must be a number"}), 400
+    try:
+        subscription = show_feed.subscribe(topics)
+    except HubFull:
+        return Response('Too many live feed clients, please retry shortly.',
+                        503, {'Retry-After': '5'})
+    response = Response(
+        stream(show_feed, subscription, app.config['LIVE_FEED_HEARTBEAT']),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # also covers clients that go away before the first byte is sent
+    response.call_on_close(lambda: show_feed.unsubscribe(subscription))
+    return response
+
+
 @app.route('/shows/create')
 def create_shows():
     # renders form. do not touch.
@@ -517,27 +1174,251 @@ def create_shows():
     return render_template('forms/new_show.html', form=form)
 
 
+def add_show_rollups(bookings):
+    # counts the shows being inserted into the rollups, in the caller's
+    # transaction
+    artist_genres = dict(db.session.query(Artist.id, Artist.genres).filter(
+        Artist.id.in_(set(booking['Artist_id'] for booking in bookings))))
+    venue_places = dict(
+        (venue.id, (venue.city, venue.state)) for venue in
+        db.session.query(Venue.id, Venue.city, Venue.state).filter(
+            Venue.id.in_(set(booking['Venue_id'] for booking in bookings))))
+    genre_months, city_weeks = rollups.count_shows(
+        (artist_genres.get(booking['Artist_id']),) +
+        venue_places.get(booking['Venue_id'], (None, None)) +
+        (booking['start_time'],) for booking in bookings)
+    rollups.add_counts(db.session, ShowGenreMonth, genre_months)
+    rollups.add_counts(db.session, ShowCityWeek, city_weeks)
+
+
+def schedule_shows(bookings):
+    # inserts every booking in one transaction and reports, per occurrence,
+    # whether it was created, names a venue or artist that does not exist,
+    # or clashes with an existing show (same venue or same artist at the
+    # same start time) or with an earlier row of the batch
+    venue_ids = set(venue_id for venue_id, in db.session.query(Venue.id).
+                    filter(Venue.id.in_(set(booking['Venue_id']
+                                            for booking in bookings))))
+    artist_ids = set(artist_id for artist_id, in db.session.query(Artist.id).
+                     filter(Artist.id.in_(set(booking['Artist_id']
+                                              for booking in bookings))))
+    start_times = set(booking['start_time'] for booking in bookings)
+    taken = set()
+    existing = db.session.query(
+        Show.c.Venue_id, Show.c.Artist_id, Show.c.start_time).\
+        filter(Show.c.start_time.in_(start_times)).\
+        all()
+    for show in existing:
+        taken.add(('venue', show.Venue_id, show.start_time))
+        taken.add(('artist', show.Artist_id, show.start_time))
+
+    rows = []
+    results = []
+    for booking in bookings:
+        venue_key = ('venue', booking['Venue_id'], booking['start_time'])
+        artist_key = ('artist', booking['Artist_id'], booking['start_time'])
+        result = {
+            "venue_id": booking['Venue_id'],
+            "artist_id": booking['Artist_id'],
+            "start_time": booking['start_time'].isoformat(),
+            "status": "created"
+        }
+        if booking['Venue_id'] not in venue_ids:
+            result["status"] = "conflict"
+            result["reason"] = "venue does not exist"
+        elif booking['Artist_id'] not in artist_ids:
+            result["status"] = "conflict"
+            result["reason"] = "artist does not exist"
+        elif venue_key in taken:
+            result["status"] = "conflict"
+            result["reason"] = "venue already has a show at this time"
+        elif artist_key in taken:
+            result["status"] = "conflict"
+            result["reason"] = "artist already plays a show at this time"
+        else:
+            taken.add(venue_key)
+            taken.add(artist_key)
+            rows.append(booking)
+        results.append(result)
+
+    if rows:
+        db.session.execute(Show.insert(), rows)
+        add_show_rollups(rows)
+    db.session.commit()
+    return results
+
+
+def schedule_sharded_shows(bookings):
+    # shows are stored with their venue: each shard's bookings are
+    # scheduled there and the results put back in booking order
+    if not shards.enabled:
+        return schedule_shows(bookings)
+    venue_groups = venue_shards(booking['Venue_id'] for booking in bookings)
+    db.session.close()
+    results = [None] * len(bookings)
+    positions = {}
+    for position, booking in enumerate(bookings):
+        group = venue_groups.get(booking['Venue_id'])
+        if group is None:
+            results[position] = {
+                "venue_id": booking['Venue_id'],
+                "artist_id": booking['Artist_id'],
+                "start_time": booking['start_time'].isoformat(),
+                "status": "conflict",
+                "reason": "venue does not exist"
+            }
+        else:
+            positions.setdefault(group, []).append(position)
+    for group, group_positions in positions.items():
+        with shards.use(group):
+            try:
+                group_results = schedule_shows(
+                    [bookings[position] for position in group_positions])
+            except:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.close()
+        for position, result in zip(group_positions, group_results):
+            results[position] = result
+    return results
+
+
+show_feed = Hub(max_subscribers=app.config['LIVE_FEED_MAX_SUBSCRIBERS'],
+                queue_size=app.config['LIVE_FEED_QUEUE_SIZE'])
+
+
+def announce_new_shows(results):
+    # re-renders the snapshots of the pages listing the new shows and tells
+    # /shows/stream subscribers and the homepage panels about the
+    # committed upcoming ones
+    booked = [result for result in results if result['status'] == 'created']
+    if booked:
+        pages_changed('/shows', *set(
+            ['/venues/%d' % result['venue_id'] for result in booked] +
+            ['/artists/%d' % result['artist_id'] for result in booked]))
+    created = [result for result in booked
+               if dateutil.parser.parse(result['start_time']) > datetime.now()]
+    if not created:
+        return
+    try:
+        venue_ids = set(result['venue_id'] for result in created)
+
+        def venue_rows():
+            return db.session.query(
+                Venue.id, Venue.name, Venue.city, Venue.state).\
+                filter(Venue.id.in_(venue_ids)).all()
+        venues = {venue.id: venue for venue in on_all_shards(venue_rows)}
+        artists = {artist.id: artist for artist in db.session.query(
+            Artist.id, Artist.name, Artist.image_link).
+            filter(Artist.id.in_(set(result['artist_id']
+                                     for result in created))).all()}
+        for result in created:
+            venue = venues.get(result['venue_id'])
+            artist = artists.get(result['artist_id'])
+            if venue is None or artist is None:
+                continue
+            home_panels.show_booked(venue.id, venue.name)
+            show_feed.publish(
+                [city_topic(venue.city), venue_topic(venue.id)], 'show', {
+                    "venue_id": venue.id,
+                    "venue_name": venue.name,
+                    "city": venue.city,
+                    "state": venue.state,
+                    "artist_id": artist.id,
+                    "artist_name": artist.name,
+                    "artist_image_link": artist.image_link,
+                    "start_time": result['start_time']
+                })
+    except:
+        # the shows are committed, a missed live update is not an error
+        app.logger.exception('announcing new shows failed')
+
+
+def flush_show_batch(rows):
+    # runs on the batch writer thread, with its own session
+    with app.app_context():
+        try:
+            results = schedule_sharded_shows(rows)
+            announce_new_shows(results)
+            return results
+        except:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+
+show_writer = BatchWriter(
+    flush_show_batch,
+    max_rows=app.config['SHOW_INGEST_MAX_ROWS'],
+    max_delay=app.config['SHOW_INGEST_MAX_DELAY_MS'] / 1000.0)
+
+
+def ingest_shows(bookings):
+    # same results as schedule_shows; with SHOW_INGEST_BATCHING the rows
+    # are committed together with other requests' shows and this returns
+    # once that batch is committed
+    if not app.config['SHOW_INGEST_BATCHING']:
+        results = schedule_sharded_shows(bookings)
+        announce_new_shows(results)
+        return results
+    if not bookings:
+        return []
+    ticket = show_writer.submit(bookings)
+    return ticket.wait(app.config['SHOW_INGEST_TIMEOUT'])
+
+
+def expand_booking(venue_id, artist_id, start_time, every_days=None,
+                   until=None, rule=None):
+    return [{
+        "Venue_id": venue_id,
+        "Artist_id": artist_id,
+        "start_time": occurrence
+    } for occurrence in expand_occurrences(
+        start_time, every_days=every_days, until=until, rule=rule,
+        limit=app.config['MAX_SHOW_OCCURRENCES'])]
+
+
+def flash_schedule_results(results):
+    created = [r for r in results if r['status'] == 'created']
+    conflicts = [r for r in results if r['status'] == 'conflict']
+    if created:
+        flash(str(len(created)) + ' show(s) were successfully listed!')
+    for conflict in conflicts:
+        flash('Show on ' + conflict['start_time'] + ' was not listed: ' +
+              conflict['reason'] + '.')
+
+
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
-    error = False
-    if request.method == 'POST':
+    # a repeat interval or rule books the whole series in a single transaction
+    form = ShowForm(request.form)
+    if form.validate():
         try:
-            show = Show.insert().values(
-                Venue_id=request.form.get('venue_id'),
-                Artist_id=request.form.get('artist_id'),
-                start_time=request.form.get('start_time')
-            )
-            db.session.execute(show)
-            db.session.commit()
-            # on successful db insert, flash success
-            flash('Show was successfully listed!')
+            bookings = expand_booking(
+                int(form.venue_id.data),
+                int(form.artist_id.data),
+                form.start_time.data,
+                every_days=form.repeat_every.data,
+                until=form.repeat_until.data,
+                rule=form.repeat_rule.data)
+            flash_schedule_results(ingest_shows(bookings))
+        except FlushTimeout:
+            flash('Show was received but is not confirmed yet, '
+                  'please check the venue page shortly.')
+        except RecurrenceError as e:
+            flash('Show could not be listed: ' + str(e))
+        except ValueError:
+            flash('Show could not be listed: venue and artist ids must be '
+                  'numbers.')
+        except PoolTimeoutError:
+            raise
         except:
             flash('An error occurred. Show could not be listed.')
-            error = True
             db.session.rollback()
-            print(sys.exc_info())
-        # on successful db insert, flash success
+            app.logger.exception('%s failed', request.endpoint)
         finally:
             db.session.close()
     else:
@@ -545,6 +1426,549 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
+@app.route('/shows/bulk', methods=['GET'])
+def create_shows_bulk():
+    form = BulkShowForm()
+    return render_template('forms/bulk_show.html', form=form)
+
+
+@app.route('/shows/bulk', methods=['POST'])
+def create_shows_bulk_submission():
+    # several single shows from one form, inserted together
+    form = BulkShowForm(request.form)
+    if form.validate():
+        bookings = [{
+            "Venue_id": row.venue_id.data,
+            "Artist_id": row.artist_id.data,
+            "start_time": row.start_time.data
+        } for row in form.shows
+            if row.venue_id.data and row.artist_id.data and row.start_time.data]
+        try:
+            flash_schedule_results(ingest_shows(bookings))
+        except PoolTimeoutError:
+            raise
+        except:
+            flash('An error occurred. Shows could not be listed.')
+            db.session.rollback()
+            app.logger.exception('%s failed', request.endpoint)
+        finally:
+            db.session.close()
+    else:
+        flash(form.errors)
+    return render_template('pages/home.html')
+
+
+@app.route('/api/shows/schedule', methods=['POST'])
+@csrf.exempt
+def schedule_shows_api():
+    # JSON body: {"shows": [{"venue_id", "artist_id", "start_time",
+    #             "every_days"?, "until"?, "rule"?}, ...]}
+    # answers with one result per expanded occurrence
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict) or \
+            not isinstance(payload.get('shows', []), list):
+        return jsonify({"error": "body must be {\"shows\": [...]}"}), 400
+    bookings = []
+    try:
+        for item in payload.get('shows', []):
+            if not isinstance(item, dict):
+                raise TypeError('each show must be an object')
+            if not isinstance(item.get('rule') or '', str):
+                raise TypeError('rule must be a string')
+            until = item.get('until')
+            bookings.extend(expand_booking(
+                int(item['venue_id']),
+                int(item['artist_id']),
+                dateutil.parser.parse(item['start_time']),
+                every_days=item.get('every_days'),
+                until=dateutil.parser.parse(until) if until else None,
+                rule=item.get('rule')))
+            if len(bookings) > app.config['MAX_SHOW_OCCURRENCES']:
+                return jsonify({"error": "too many shows in one request"}), 400
+    except RecurrenceError as e:
+        return jsonify({"error": "invalid booking: " + str(e)}), 400
+    except KeyError as e:
+        return jsonify({"error": "invalid booking: missing " + e.args[0]}), 400
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({"error": "invalid booking: venue_id and artist_id "
+                                 "must be integers, start_time and until "
+                                 "dates, every_days an integer and rule a "
+                                 "string"}), 400
+    try:
+        results = ingest_shows(bookings)
+    except FlushTimeout:
+        return jsonify({"status": "queued",
+                        "error": "shows not confirmed in time"}), 202
+    except PoolTimeoutError:
+        raise
+    except:
+        db.session.rollback()
+        app.logger.exception('%s failed', request.endpoint)
+        return jsonify({"error": "shows could not be listed"}), 500
+    finally:
+        db.session.close()
+    return jsonify({
+        "created": sum(1 for r in results if r['status'] == 'created'),
+        "results": results
+    })
+
+
+#  Export
+#  ----------------------------------------------------------------
+
+def export_statement(start=None, end=None, changed_since=None):
+    # shows from the hot and archive tables joined with their venue and
+    # artist, in EXPORT_COLUMNS order
+    all_shows = union_all(
+        select([Show.c.Venue_id, Show.c.Artist_id,
+                Show.c.start_time, Show.c.created_at]),
+        select([ShowArchive.c.Venue_id, ShowArchive.c.Artist_id,
+                ShowArchive.c.start_time, ShowArchive.c.created_at])
+    ).alias('all_shows')
+    statement = select([
+        all_shows.c.start_time,
+        all_shows.c.created_at,
+        Venue.id, Venue.name, Venue.city, Venue.state,
+        Artist.id, Artist.name, Artist.genres
+    ]).select_from(
+        all_shows.
+        join(Venue, Venue.id == all_shows.c.Venue_id).
+        join(Artist, Artist.id == all_shows.c.Artist_id)
+    ).order_by(all_shows.c.start_time)
+    if start:
+        statement = statement.where(all_shows.c.start_time >= start)
+    if end:
+        statement = statement.where(all_shows.c.start_time < end)
+    if changed_since:
+        statement = statement.where(all_shows.c.created_at >= changed_since)
+    return statement
+
+
+def export_batches(statement, batch_size):
+    # rows come from a server-side cursor on a dedicated connection, so
+    # memory stays at one batch whatever the size of the catalog. with
+    # sharding every shard is streamed at once and the rows are merged in
+    # start time order
+    if not shards.enabled:
+        connection = db.engine.connect().\
+            execution_options(stream_results=True)
+        try:
+            for rows in iter_batches(connection.execute(statement),
+                                     batch_size):
+                yield rows
+        finally:
+            connection.close()
+        return
+    connections = [shards.engines[group].connect().
+                   execution_options(stream_results=True)
+                   for group in shards.groups]
+    try:
+        rows = heapq.merge(*[connection.execute(statement)
+                             for connection in connections],
+                           key=lambda row: row.start_time)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            yield batch
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def parse_export_date(value):
+    return dateutil.parser.parse(value) if value else None
+
+
+@app.route('/export/shows')
+def export_shows():
+    # ?format=csv|parquet&start=&end=&changed_since=
+    # needs "Authorization: Bearer <EXPORT_TOKEN>"
+    token = app.config['EXPORT_TOKEN']
+    supplied = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(supplied, 'Bearer ' + token):
+        abort(403)
+    try:
+        statement = export_statement(
+            start=parse_export_date(request.args.get('start')),
+            end=parse_export_date(request.args.get('end')),
+            changed_since=parse_export_date(request.args.get('changed_since')))
+    except (ValueError, OverflowError):
+        abort(400)
+    batches = export_batches(statement, app.config['EXPORT_BATCH_SIZE'])
+    if request.args.get('format', 'csv') == 'parquet':
+        # Parquet needs a seekable sink, spool it to disk batch by batch
+        spool = tempfile.TemporaryFile()
+        try:
+            write_parquet(batches, spool)
+        except RuntimeError:
+            spool.close()
+            abort(501)
+        spool.seek(0)
+        return send_file(spool, mimetype='application/vnd.apache.parquet',
+                         as_attachment=True,
+                         attachment_filename='shows.parquet')
+    return Response(stream_with_context(iter_csv(batches)),
+                    mimetype='text/csv',
+                    headers={'Content-Disposition':
+                             'attachment; filename=shows.csv'})
+
+
+@app.cli.command('export')
+@click.option('--format', 'export_format', type=click.Choice(['csv', 'parquet']),
+              default='csv')
+@click.option('--output', default='-',
+              help='File to write, "-" for stdout (CSV only).')
+@click.option('--start', default=None, help='Only shows starting at or after.')
+@click.option('--end', default=None, help='Only shows starting before.')
+@click.option('--changed-since', default=None,
+              help='Only shows listed at or after, for incremental dumps.')
+@click.option('--batch-size', type=int, default=None)
+def export_command(export_format, output, start, end, changed_since,
+                   batch_size):
+    """Dump shows joined with venue and artist data."""
+    statement = export_statement(start=parse_export_date(start),
+                                 end=parse_export_date(end),
+                                 changed_since=parse_export_date(changed_since))
+    batches = export_batches(statement,
+                             batch_size or app.config['EXPORT_BATCH_SIZE'])
+    if export_format == 'parquet':
+        if output == '-':
+            raise click.UsageError('Parquet export needs --output')
+        write_parquet(batches, output)
+        return
+    with click.open_file(output, 'w') as sink:
+        for chunk in iter_csv(batches):
+            sink.write(chunk)
+
+
+#  Archival
+#  ----------------------------------------------------------------
+
+@app.cli.command('archive-shows')
+@click.option('--horizon-days', type=int, default=None,
+              help='Archive shows older than this (ARCHIVE_HORIZON_DAYS).')
+@click.option('--batch-size', type=int, default=None)
+@click.option('--pause', type=float, default=None,
+              help='Seconds to sleep between batches.')
+@click.option('--max-batches', type=int, default=None)
+def archive_shows_command(horizon_days, batch_size, pause, max_batches):
+    """Move past shows into ShowArchive. Meant to be run from cron."""
+    if horizon_days is None:
+        horizon_days = app.config['ARCHIVE_HORIZON_DAYS']
+    cutoff = datetime.now() - timedelta(days=horizon_days)
+
+    def progress(batches, total):
+        click.echo('batch %d: %d shows archived' % (batches, total))
+
+    # shows live on their venue's shard, so each shard is archived in turn
+    for group in shards.groups if shards.enabled else [None]:
+        if group is not None:
+            click.echo('%s:' % group)
+        with shards.use(group):
+            try:
+                total = archive_shows(
+                    db.session, Show, ShowArchive, cutoff,
+                    batch_size=batch_size or app.config['ARCHIVE_BATCH_SIZE'],
+                    pause=app.config['ARCHIVE_BATCH_PAUSE']
+                    if pause is None else pause,
+                    max_batches=max_batches,
+                    progress=progress)
+            finally:
+                db.session.close()
+        click.echo('%d shows older than %s archived' % (total, cutoff))
+
+
+#  Duplicates
+#  ----------------------------------------------------------------
+
+@app.cli.command('merge-duplicates')
+@click.option('--kind', type=click.Choice(['venue', 'artist', 'all']),
+              default='all')
+@click.option('--dry-run', is_flag=True,
+              help='Fill missing fingerprints and report the duplicate '
+              'groups without merging them.')
+@click.option('--batch-size', type=int, default=1000,
+              help='Rows per commit when filling missing fingerprints.')
+def merge_duplicates_command(kind, dry_run, batch_size):
+    """Merge venues/artists with the same name, city and state."""
+    if shards.enabled:
+        raise click.UsageError('run against each database with FYYUR_SHARDS '
+                               'unset, artists are copied to every shard')
+    kinds = [('venue', Venue, 'Venue_id', VENUE_EDIT_COLUMNS),
+             ('artist', Artist, 'Artist_id', ARTIST_EDIT_COLUMNS)]
+    for name, model, owner_key, columns in kinds:
+        if kind not in (name, 'all'):
+            continue
+        table = model.__table__
+        filled = duplicates.fill_fingerprints(db.session, table, batch_size)
+        groups = duplicates.duplicate_groups(db.session, table)
+        click.echo('%s: %d fingerprints filled, %d duplicate groups' %
+                   (name, filled, len(groups)))
+        for ids in groups:
+            if dry_run:
+                click.echo('  would merge %s into %d' %
+                           (', '.join(str(i) for i in ids[1:]), ids[0]))
+                continue
+            if app.config['SNAPSHOT_DIR']:
+                # dynamic until the next `flask snapshot`
+                paths = ['/%ss' % name, '/shows']
+                for record_id in ids:
+                    paths.append('/%ss/%d' % (name, record_id))
+                    paths += show_partner_pages(owner_key, record_id)
+                for path in paths:
+                    snapshots.remove_snapshot(app.config['SNAPSHOT_DIR'],
+                                              path)
+            moved = duplicates.merge_group(
+                db.session, table, ids, [Show, ShowArchive], owner_key,
+                columns + ('seeking_description',))
+            click.echo('  merged %s into %d, %d shows moved' %
+                       (', '.join(str(i) for i in ids[1:]), ids[0], moved))
+
+
+#  Seed data
+#  ----------------------------------------------------------------
+
+@app.cli.command('seed')
+@click.option('--venues', type=int, default=1000)
+@click.option('--artists', type=int, default=5000)
+@click.option('--shows', type=int, default=10000,
+              help='e.g. 10000, 1000000 or 10000000.')
+@click.option('--seed', 'seed_value', type=int, default=0,
+              help='Same seed, same data.')
+@click.option('--years-past', type=float, default=5,
+              help='How far back the show history goes.')
+@click.option('--upcoming-fraction', type=float, default=0.1)
+@click.option('--skew', type=float, default=1.2,
+              help='Zipf exponent for hot venues; artists use 2/3 of it.')
+@click.option('--batch-size', type=int, default=10000)
+def seed_command(venues, artists, shows, seed_value, years_past,
+                 upcoming_fraction, skew, batch_size):
+    """Bulk load synthetic venues, artists and shows."""
+    if shards.enabled:
+        raise click.UsageError('seed with FYYUR_SHARDS unset, the generated '
+                               'venues are not spread over the shards')
+    def progress(table, total):
+        click.echo('%s: %d rows' % (table, total))
+
+    seed.seed(db.session, Venue.__table__, Artist.__table__, Show,
+              venues, artists, shows, seed=seed_value, years_past=years_past,
+              upcoming_fraction=upcoming_fraction, skew=skew,
+              batch_size=batch_size, progress=progress)
+
+
+#  Stats
+#  ----------------------------------------------------------------
+
+STATS_ROLLUPS = {
+    # ?by=: (table, period column, period of a date, filter parameters,
+    # default days shown)
+    'genre': (ShowGenreMonth, 'month', rollups.month_of, ('genre',), 365),
+    'city': (ShowCityWeek, 'week', rollups.week_of, ('city', 'state'), 84),
+}
+
+
+def rollup_source():
+    # (genres, city, state, start_time) of every live and archived show
+    def shows_of(table):
+        return select([Artist.genres, Venue.city, Venue.state,
+                       table.c.start_time]).select_from(
+            table.join(Venue, Venue.id == table.c.Venue_id).
+            join(Artist, Artist.id == table.c.Artist_id))
+    return union_all(shows_of(Show), shows_of(ShowArchive))
+
+
+@app.route('/stats')
+def stats():
+    # ?by=genre|city&from=YYYY-MM-DD&to=YYYY-MM-DD (default: the last year
+    # of months or the last 12 weeks) and optionally &genre= or
+    # &city=&state=. answered from the rollup tables only
+    by = request.args.get('by', 'genre')
+    if by not in STATS_ROLLUPS:
+        return jsonify({"error": "by must be genre or city"}), 400
+    table, period, period_of, filters, default_days = STATS_ROLLUPS[by]
+    try:
+        end = parse_export_date(request.args.get('to')) or datetime.now()
+        start = parse_export_date(request.args.get('from')) or \
+            end - timedelta(days=default_days)
+    except (ValueError, OverflowError):
+        return jsonify({"error": "from and to must be dates"}), 400
+    # from= counts its whole month or week
+    statement = select([table]).\
+        where(table.c[period] >= period_of(start)).\
+        where(table.c[period] <= end.date())
+    for name in filters:
+        if request.args.get(name):
+            statement = statement.where(table.c[name] == request.args[name])
+
+    def counts():
+        return db.session.execute(statement).fetchall()
+    totals = {}
+    keys = [column.name for column in table.primary_key.columns]
+    for row in on_all_shards(counts):
+        key = tuple(row[name] for name in keys)
+        totals[key] = totals.get(key, 0) + row.shows
+    data = [dict(zip(keys, key), shows=shows)
+            for key, shows in sorted(totals.items(),
+                                     key=lambda item: (item[0][-1],
+                                                       item[0][:-1]))]
+    for item in data:
+        item[period] = item[period].isoformat()
+    return jsonify({
+        "by": by,
+        "period": period,
+        "from": period_of(start).isoformat(),
+        "to": end.date().isoformat(),
+        "data": data
+    })
+
+
+@app.cli.command('rebuild-rollups')
+@click.option('--batch-size', type=int, default=10000,
+              help='Shows read per fetch.')
+def rebuild_rollups_command(batch_size):
+    """Recount the /stats rollups from every live and archived show."""
+    if not shards.enabled:
+        total = rollups.rebuild(db.session, rollup_source(), ShowGenreMonth,
+                                ShowCityWeek, batch_size=batch_size)
+        click.echo('%d shows counted' % total)
+        return
+    # each shard counts the shows it holds; /stats sums over the shards
+    for group in shards.groups:
+        with shards.use(group):
+            try:
+                total = rollups.rebuild(db.session, rollup_source(),
+                                        ShowGenreMonth, ShowCityWeek,
+                                        batch_size=batch_size)
+            finally:
+                db.session.close()
+        click.echo('%s: %d shows counted' % (group, total))
+
+
+#  Snapshots
+#  ----------------------------------------------------------------
+
+@app.cli.command('snapshot')
+@click.option('--processes', type=int, default=None,
+              help='Renderer processes (one per CPU by default).')
+@click.option('--chunk-size', type=int, default=50,
+              help='Pages handed to a process at a time.')
+def snapshot_command(processes, chunk_size):
+    """Render the venue, artist and show pages to SNAPSHOT_DIR."""
+    directory = app.config['SNAPSHOT_DIR']
+    if not directory:
+        raise click.UsageError('set FYYUR_SNAPSHOT_DIR')
+
+    def venue_ids():
+        return [row[0] for row in db.session.query(Venue.id)]
+    paths = ['/venues', '/artists', '/shows']
+    paths += ['/venues/%d' % venue_id
+              for venue_id in sorted(on_all_shards(venue_ids))]
+    paths += ['/artists/%d' % row[0]
+              for row in db.session.query(Artist.id).order_by(Artist.id)]
+    db.session.remove()
+    # the renderer processes are forked: none may inherit a connection
+    db.engine.dispose()
+    for shard_engine in shards.engines.values():
+        shard_engine.dispose()
+    started = time.monotonic()
+
+    def progress(done, total):
+        click.echo('%d/%d pages' % (done, total))
+
+    written = snapshots.render_parallel(app, directory, paths,
+                                        processes=processes,
+                                        chunk_size=chunk_size,
+                                        progress=progress)
+    click.echo('%d of %d pages written to %s in %.1fs' %
+               (written, len(paths), directory, time.monotonic() - started))
+
+
+#  Query plan checks
+#  ----------------------------------------------------------------
+
+def plan_check_routes():
+    # read-only routes exercised by `flask check-plans`, against ids taken
+    # from the (seeded) database
+    venue_id = db.session.query(func.min(Venue.id)).scalar() or 1
+    artist_id = db.session.query(func.min(Artist.id)).scalar() or 1
+    db.session.close()
+    return [
+        ('GET', '/', None),
+        ('GET', '/venues', None),
+        ('GET', '/venues/%d' % venue_id, None),
+        ('GET', '/venues/%d/edit' % venue_id, None),
+        ('POST', '/venues/search', {'search_term': 'music'}),
+        ('GET', '/artists', None),
+        ('GET', '/artists/%d' % artist_id, None),
+        ('GET', '/artists/%d/edit' % artist_id, None),
+        ('POST', '/artists/search', {'search_term': 'band'}),
+        ('GET', '/shows', None),
+        ('GET', '/autocomplete?type=venue&q=the', None),
+    ]
+
+
+@app.cli.command('check-plans')
+@click.option('--golden', default='query_plans.json',
+              help='Golden file with the expected plans.')
+@click.option('--update', is_flag=True,
+              help='Record the current plans as the new golden file.')
+@click.option('--tolerance', type=float, default=0.5,
+              help='Allowed relative increase of the estimated cost.')
+def check_plans_command(golden, update, tolerance):
+    """EXPLAIN every query the routes run and compare with the golden file."""
+    if shards.enabled:
+        raise click.UsageError('run with FYYUR_SHARDS unset, only queries on '
+                               'the primary database are captured')
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['RATE_LIMITS'] = {}
+    client = app.test_client()
+    current = {}
+    for method, path, form in plan_check_routes():
+        # a cached search runs no query at all
+        search_cache.clear()
+        with query_plans.capture_selects(db.engine) as captured:
+            response = client.open(path, method=method, data=form)
+        if response.status_code >= 500:
+            raise click.ClickException('%s %s answered %d'
+                                       % (method, path, response.status_code))
+        # ids differ between databases, key routes by their pattern
+        route = method + ' ' + re.sub(r'/\d+', '/<id>', path)
+        current[route] = query_plans.explain(db.engine, captured)
+
+    if update:
+        with open(golden, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        click.echo('wrote plans for %d routes to %s' % (len(current), golden))
+        return
+    with open(golden) as f:
+        expected = json.load(f)
+    problems = query_plans.compare(expected, current, tolerance)
+    for problem in problems:
+        click.echo(problem, err=True)
+    if problems:
+        raise SystemExit(1)
+    click.echo('%d routes match %s' % (len(current), golden))
+
+
+#  Metrics
+#  ----------------------------------------------------------------
+
+@app.route('/metrics')
+def metrics():
+    return jsonify({
+        "db_pool": pool_stats.snapshot(db.engine.pool),
+        "shard_pools": dict(
+            (group, stats.snapshot(shards.engines[group].pool))
+            for group, stats in shard_pool_stats.items()),
+        "search_cache": search_cache.snapshot(),
+        "live_feed": show_feed.snapshot(),
+        "show_ingest": dict(show_writer.stats.snapshot(),
+                            enabled=app.config['SHOW_INGEST_BATCHING'],
+                            queued_rows=show_writer.queued_rows())
+    })
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -555,16 +1979,20 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+@app.errorhandler(PoolTimeoutError)
+def database_busy_error(error):
+    # no connection freed up within pool_timeout, fail fast and let the
+    # client retry rather than piling more requests onto the pool. routes
+    # with a catch-all error handler re-raise it to end up here
+    db.session.rollback()
+    return Response('The service is busy, please retry shortly.', 503,
+                    {'Retry-After': '1'})
+
+
+setup_logging(app)
+install_access_log(app)
+snapshots.install_snapshots(app, SNAPSHOT_ENDPOINTS)
+install_profiler(app, markers={'datetime filter': [format_datetime]})
 
 #----------------------------------------------------------------------------#
 # Launch.
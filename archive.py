@@ -0,0 +1,63 @@
+# moves old shows from the hot Show table into ShowArchive
+import time
+
+from sqlalchemy import and_, func, select
+
+
+def archive_batch(session, shows, archive, cutoff, batch_size):
+    # moves roughly <batch_size> of the oldest shows older than <cutoff>.
+    # Show has no primary key, so the batch is cut at a start_time boundary:
+    # every show up to the start time of the last row of the batch is moved.
+    # returns the number of shows moved
+    boundary = session.execute(
+        select([shows.c.start_time]).
+        where(shows.c.start_time < cutoff).
+        order_by(shows.c.start_time).
+        offset(batch_size - 1).
+        limit(1)
+    ).scalar()
+    if boundary is None:
+        boundary = session.execute(
+            select([func.max(shows.c.start_time)]).
+            where(shows.c.start_time < cutoff)
+        ).scalar()
+        if boundary is None:
+            return 0
+    columns = [column.name for column in shows.c]
+    batch = and_(shows.c.start_time <= boundary, shows.c.start_time < cutoff)
+    if session.connection().dialect.name == 'postgresql':
+        # one statement: exactly the rows deleted are archived, even when
+        # a show in the range commits while the batch runs
+        moved = shows.delete().where(batch).\
+            returning(*[shows.c[name] for name in columns]).cte('moved')
+        result = session.execute(archive.insert().from_select(
+            columns, select([moved.c[name] for name in columns])))
+    else:
+        # SQLite: the INSERT takes the database write lock, so no other
+        # writer can add a show to the range before the DELETE
+        session.execute(archive.insert().from_select(
+            columns, select([shows.c[name] for name in columns]).
+            where(batch)))
+        result = session.execute(shows.delete().where(batch))
+    session.commit()
+    return result.rowcount
+
+
+def archive_shows(session, shows, archive, cutoff, batch_size=500,
+                  pause=0.0, max_batches=None, progress=None):
+    # runs batches until nothing older than <cutoff> is left in the hot
+    # table. each batch is its own short transaction and <pause> seconds
+    # are slept in between to keep lock time and I/O bursts small
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(session, shows, archive, cutoff, batch_size)
+        if not moved:
+            break
+        total += moved
+        batches += 1
+        if progress:
+            progress(batches, total)
+        if pause:
+            time.sleep(pause)
+    return total
@@ -0,0 +1,142 @@
+# in-process prefix index over venue and artist names for /autocomplete.
+# each worker process has its own copy: its own creates and edits are
+# applied at once, everything else (other workers, command line merges)
+# shows up when IndexRefresher reloads it from the database
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+logger = logging.getLogger(__name__)
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    return ' '.join(WORD.findall((text or '').casefold()))
+
+
+class PrefixIndex(object):
+    # sorted array of (key, id) pairs. every name is indexed under its full
+    # normalized form and under each word, so "hop" finds "The Musical Hop".
+    # lookups are a bisect plus a short scan, no database involved
+
+    def __init__(self):
+        self._keys = []
+        self._names = {}
+        self._lock = threading.Lock()
+        # names added while a reload reads the database, replayed on top
+        # of what it read so a reload cannot undo them
+        self._added_during_load = None
+        self.loaded = False
+        self.loaded_at = None
+
+    def _entries(self, record_id, name):
+        full = normalize(name)
+        if not full:
+            return []
+        words = set(full.split(' '))
+        words.add(full)
+        return [(key, record_id) for key in words]
+
+    def load(self, rows):
+        # rows of (id, name), replaces the whole index
+        self.reload(lambda: rows)
+
+    def reload(self, read_rows):
+        # replaces the whole index with the (id, name) rows <read_rows>
+        # returns. add() calls made while it runs are kept
+        with self._lock:
+            self._added_during_load = {}
+        try:
+            names = dict(read_rows())
+        except Exception:
+            with self._lock:
+                self._added_during_load = None
+            raise
+        with self._lock:
+            names.update(self._added_during_load)
+            self._added_during_load = None
+            keys = []
+            for record_id, name in names.items():
+                keys.extend(self._entries(record_id, name))
+            keys.sort()
+            self._keys = keys
+            self._names = names
+            self.loaded = True
+            self.loaded_at = time.time()
+
+    def add(self, record_id, name):
+        with self._lock:
+            if self._added_during_load is not None:
+                self._added_during_load[record_id] = name
+            self._remove(record_id)
+            self._names[record_id] = name
+            for entry in self._entries(record_id, name):
+                insort(self._keys, entry)
+
+    def remove(self, record_id):
+        with self._lock:
+            self._remove(record_id)
+
+    def _remove(self, record_id):
+        name = self._names.pop(record_id, None)
+        if name is None:
+            return
+        for entry in self._entries(record_id, name):
+            position = bisect_left(self._keys, entry)
+            if position < len(self._keys) and self._keys[position] == entry:
+                del self._keys[position]
+
+    def search(self, prefix, limit=10):
+        # returns up to <limit> (id, name) pairs whose name or one of its
+        # words starts with <prefix>, in key order
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            keys = self._keys
+            names = self._names
+            position = bisect_left(keys, (prefix,))
+            while position < len(keys) and len(results) < limit:
+                key, record_id = keys[position]
+                if not key.startswith(prefix):
+                    break
+                if record_id not in seen:
+                    seen.add(record_id)
+                    results.append((record_id, names[record_id]))
+                position += 1
+        return results
+
+
+class IndexRefresher(object):
+    # reloads every index of <indexes> ({kind: PrefixIndex}) with
+    # <read_names>(kind) on a background thread, right away and then every
+    # <interval> seconds
+
+    def __init__(self, indexes, read_names, interval=60):
+        self.indexes = indexes
+        self.interval = interval
+        self._read_names = read_names
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='autocomplete', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            for kind, index in self.indexes.items():
+                try:
+                    index.reload(lambda: self._read_names(kind))
+                except Exception:
+                    # keep serving the incrementally maintained index
+                    logger.exception('reloading the %s names failed', kind)
+            time.sleep(self.interval)
@@ -0,0 +1,182 @@
+# group commit for high-rate inserts: rows submitted by many requests are
+# collected by one background thread and written as a single multi-row
+# insert and commit, flushed every <max_rows> rows or <max_delay> seconds
+import atexit
+import threading
+import time
+from collections import deque
+
+
+class FlushTimeout(Exception):
+    pass
+
+
+class Ticket(object):
+    # handed back by submit(); wait() returns once the batch holding these
+    # rows has been committed, which is the durability acknowledgement
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.submitted = time.monotonic()
+        self.results = None
+        self.error = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise FlushTimeout('rows were not flushed within %ss' % timeout)
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+    def finish(self, results=None, error=None):
+        self.results = results
+        self.error = error
+        self._done.set()
+
+
+class BatchStats(object):
+
+    def __init__(self, samples=1000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=samples)
+        self.batches = 0
+        self.rows = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.flush_seconds = 0.0
+        self.flush_max = 0.0
+        self.errors = 0
+
+    def record(self, size, seconds):
+        # a committed batch. failed attempts only count as errors, so rows
+        # retried after a failure are counted once
+        with self._lock:
+            self._latencies.append(seconds)
+            self.batches += 1
+            self.rows += size
+            self.last_batch_size = size
+            self.max_batch_size = max(self.max_batch_size, size)
+            self.flush_seconds += seconds
+            self.flush_max = max(self.flush_max, seconds)
+
+    def record_failure(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "batches": self.batches,
+                "rows": self.rows,
+                "batch_size_avg": (float(self.rows) / self.batches
+                                   if self.batches else 0.0),
+                "batch_size_last": self.last_batch_size,
+                "batch_size_max": self.max_batch_size,
+                "flush_avg_ms": (self.flush_seconds / self.batches * 1000
+                                 if self.batches else 0.0),
+                "flush_p95_ms": (latencies[int(len(latencies) * 0.95)] * 1000
+                                 if latencies else 0.0),
+                "flush_max_ms": self.flush_max * 1000,
+                "failed_batches": self.errors
+            }
+
+
+class BatchWriter(object):
+    # <flush> receives the concatenated rows of a batch, writes and commits
+    # them, and returns one result per row (or None)
+
+    def __init__(self, flush, max_rows=500, max_delay=0.02):
+        self.flush = flush
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.stats = BatchStats()
+        self._pending = deque()
+        self._pending_rows = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closing = False
+
+    def submit(self, rows):
+        # the rows of one submission always end up in the same batch
+        ticket = Ticket(list(rows))
+        with self._cond:
+            if self._closing:
+                raise RuntimeError('batch writer is closed')
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='batch-writer')
+                self._thread.daemon = True
+                self._thread.start()
+                atexit.register(self.close)
+            self._pending.append(ticket)
+            self._pending_rows += len(ticket.rows)
+            # wakes an idle writer, or one waiting out max_delay so it can
+            # flush early once max_rows is reached
+            self._cond.notify()
+        return ticket
+
+    def queued_rows(self):
+        with self._cond:
+            return self._pending_rows
+
+    def close(self, timeout=10):
+        # flushes whatever is still queued and stops the thread
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                deadline = self._pending[0].submitted + self.max_delay
+                while self._pending_rows < self.max_rows and \
+                        not self._closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take()
+            self._write(batch)
+
+    def _take(self):
+        batch = []
+        rows = 0
+        while self._pending and (not batch or
+                                 rows + len(self._pending[0].rows) <=
+                                 self.max_rows):
+            ticket = self._pending.popleft()
+            batch.append(ticket)
+            rows += len(ticket.rows)
+        self._pending_rows -= rows
+        return batch
+
+    def _write(self, batch):
+        rows = [row for ticket in batch for row in ticket.rows]
+        started = time.monotonic()
+        try:
+            results = self.flush(rows)
+        except Exception as error:
+            self.stats.record_failure()
+            if len(batch) == 1:
+                batch[0].finish(error=error)
+                return
+            # one bad submission must not fail the others, retry them alone
+            for ticket in batch:
+                self._write([ticket])
+            return
+        self.stats.record(len(rows), time.monotonic() - started)
+        position = 0
+        for ticket in batch:
+            count = len(ticket.rows)
+            ticket.finish(results[position:position + count]
+                          if results is not None else None)
+            position += count
@@ -0,0 +1,58 @@
+# compares loading list rows as full ORM objects vs namedtuple projections.
+#   $ FYYUR_DATABASE_URL=sqlite:////tmp/bench.db python bench_projections.py --rows 100000
+# the artists table is seeded with `--rows` artists first if it has fewer
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from sqlalchemy import func, select
+
+from app import app, db, Artist
+from projections import fetch, NamedItem
+import seed
+
+
+def measure(label, load, rows):
+    db.session.remove()
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(result)
+    print('%-22s %8d rows %8.1f ms %7.2f us/row %8.0f B/row held %8.0f B/row peak'
+          % (label, count, elapsed * 1000, elapsed / count * 1e6,
+             current / count, peak / count))
+    del result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='ORM objects vs projections for list views.')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        existing = db.session.execute(
+            select([func.count()]).select_from(Artist.__table__)).scalar()
+        if existing < args.rows:
+            seed.bulk_load(db.session, Artist.__table__,
+                           seed.artist_rows(random.Random(0),
+                                            args.rows - existing))
+        for _ in range(args.repeat):
+            measure('ORM Artist objects',
+                    lambda: Artist.query.limit(args.rows).all(), args.rows)
+            measure('NamedItem projection',
+                    lambda: fetch(db.session, NamedItem,
+                                  select([Artist.id, Artist.name]).
+                                  limit(args.rows)), args.rows)
+
+
+if __name__ == '__main__':
+    main()
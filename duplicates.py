@@ -0,0 +1,103 @@
+# duplicate venues/artists: a record's fingerprint is a hash of its
+# normalized name, city and state, stored in an indexed column, so finding
+# an existing copy of a new record is one index lookup
+import hashlib
+import unicodedata
+
+from sqlalchemy import and_, bindparam, exists, func, select
+
+
+def normalize(text):
+    # casefolded, accents and punctuation removed, whitespace collapsed:
+    # "The Musical Hop!" and "the  musical hop" are the same
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(character for character in text
+                   if not unicodedata.combining(character))
+    text = ''.join(character if character.isalnum() else ' '
+                   for character in text.casefold())
+    return ' '.join(text.split())
+
+
+def fingerprint(name, city, state):
+    key = '|'.join(normalize(part) for part in (name, city, state))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def fill_fingerprints(session, table, batch_size=1000):
+    # computes missing fingerprints in id order, one commit per batch.
+    # returns the number of rows filled
+    total = 0
+    last_id = 0
+    while True:
+        rows = session.execute(
+            select([table.c.id, table.c.name, table.c.city, table.c.state]).
+            where(table.c.fingerprint.is_(None)).
+            where(table.c.id > last_id).
+            order_by(table.c.id).
+            limit(batch_size)).fetchall()
+        if not rows:
+            return total
+        session.execute(
+            table.update().where(table.c.id == bindparam('record_id')).
+            values(fingerprint=bindparam('new_fingerprint')),
+            [{"record_id": row.id,
+              "new_fingerprint": fingerprint(row.name, row.city, row.state)}
+             for row in rows])
+        session.commit()
+        total += len(rows)
+        last_id = rows[-1].id
+
+
+def duplicate_groups(session, table):
+    # [[id, ...]] of records sharing a fingerprint, oldest id first
+    shared = select([table.c.fingerprint]).\
+        where(table.c.fingerprint.isnot(None)).\
+        group_by(table.c.fingerprint).\
+        having(func.count() > 1)
+    rows = session.execute(
+        select([table.c.fingerprint, table.c.id]).
+        where(table.c.fingerprint.in_(shared)).
+        order_by(table.c.fingerprint, table.c.id)).fetchall()
+    groups = {}
+    for row in rows:
+        groups.setdefault(row.fingerprint, []).append(row.id)
+    return list(groups.values())
+
+
+def merge_group(session, table, ids, show_tables, owner_key, fill_columns):
+    # keeps the oldest record of the group: empty <fill_columns> are taken
+    # from the newer copies, their shows are moved over (dropping shows the
+    # survivor already has at the same time with the same partner) and the
+    # copies are deleted. one transaction per group. returns shows moved
+    survivor, copies = ids[0], ids[1:]
+    records = dict((row.id, row) for row in session.execute(
+        select([table]).where(table.c.id.in_(ids))).fetchall())
+    filled = {}
+    for column in fill_columns:
+        if records[survivor][column] in (None, ''):
+            for copy in copies:
+                if records[copy][column] not in (None, ''):
+                    filled[column] = records[copy][column]
+                    break
+    if filled:
+        session.execute(table.update().where(table.c.id == survivor).
+                        values(**filled))
+    moved = 0
+    partner_key = 'Artist_id' if owner_key == 'Venue_id' else 'Venue_id'
+    for shows in show_tables:
+        kept = shows.alias('kept')
+        # one copy at a time, so two copies with the same show do not both
+        # move it
+        for copy in copies:
+            session.execute(shows.delete().where(and_(
+                shows.c[owner_key] == copy,
+                exists().where(and_(
+                    kept.c[owner_key] == survivor,
+                    kept.c[partner_key] == shows.c[partner_key],
+                    kept.c.start_time == shows.c.start_time)))))
+            moved += session.execute(
+                shows.update().where(shows.c[owner_key] == copy).
+                values(**{owner_key: survivor})).rowcount
+    session.execute(table.delete().where(table.c.id.in_(copies)))
+    session.commit()
+    return moved
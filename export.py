@@ -0,0 +1,72 @@
+# streams the show catalog out as CSV or Parquet in fixed-size batches
+import csv
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+EXPORT_COLUMNS = [
+    'start_time', 'created_at',
+    'venue_id', 'venue_name', 'venue_city', 'venue_state',
+    'artist_id', 'artist_name', 'artist_genres'
+]
+
+
+def parquet_schema():
+    return pa.schema([
+        ('start_time', pa.timestamp('us')),
+        ('created_at', pa.timestamp('us')),
+        ('venue_id', pa.int64()),
+        ('venue_name', pa.string()),
+        ('venue_city', pa.string()),
+        ('venue_state', pa.string()),
+        ('artist_id', pa.int64()),
+        ('artist_name', pa.string()),
+        ('artist_genres', pa.string()),
+    ])
+
+
+def iter_batches(result, batch_size):
+    # <result> should come from a stream_results connection so rows are
+    # pulled from a server-side cursor instead of loaded all at once
+    try:
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        result.close()
+
+
+def iter_csv(batches):
+    # yields one CSV chunk per batch, header first
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def write_parquet(batches, sink):
+    # writes one row group per batch to <sink> (a path or binary file)
+    if pa is None:
+        raise RuntimeError('pyarrow is required for Parquet export')
+    schema = parquet_schema()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in batches:
+            columns = {}
+            for position, name in enumerate(EXPORT_COLUMNS):
+                columns[name] = [row[position] for row in rows]
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+    finally:
+        writer.close()
@@ -1,4 +1,8 @@
 # myapp/extensions.py
 from flask_wtf import CsrfProtect
+from ratelimit import RateLimiter
+from sharding import ShardRouter
 
-csrf = CsrfProtect()
\ No newline at end of file
+csrf = CsrfProtect()
+limiter = RateLimiter()
+shards = ShardRouter()
@@ -0,0 +1,32 @@
+# gunicorn settings for serving Fyyur with cooperative (gevent) workers.
+#   $ gunicorn -c gunicorn_config.py app:app
+# while a request waits on Postgres its greenlet yields, so a single worker
+# process keeps serving other requests instead of blocking on the socket.
+# FYYUR_WORKER_CLASS=sync falls back to one request per worker process.
+import os
+
+bind = os.environ.get('FYYUR_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('FYYUR_WORKERS', '2'))
+worker_class = os.environ.get('FYYUR_WORKER_CLASS', 'gevent')
+# concurrent requests (greenlets) per gevent worker
+worker_connections = int(os.environ.get('FYYUR_WORKER_CONNECTIONS', '200'))
+timeout = 30
+
+
+def post_fork(server, worker):
+    # gevent patches the standard library, but psycopg2 is a C extension
+    # doing its own blocking socket I/O. psycogreen installs a wait
+    # callback so queries yield to other greenlets too
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+        server.log.info('psycopg2 patched for gevent in worker %s', worker.pid)
+
+
+def post_worker_init(worker):
+    # the app is loaded by now: build the in-memory autocomplete index and
+    # homepage panels before the worker takes requests instead of on the
+    # first keystroke or homepage visit
+    from app import home_panels, name_refresher
+    name_refresher.start()
+    home_panels.start()
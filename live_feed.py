@@ -0,0 +1,136 @@
+# in-process publish/subscribe for the live show feed (/shows/stream).
+# subscribers are indexed by topic, so a publish only touches the
+# subscribers that asked for that city or venue; an idle subscriber is a
+# small queue and an Event its request waits on
+import json
+import threading
+from collections import deque
+
+ALL = ('all',)
+
+
+def city_topic(city):
+    return ('city', (city or '').strip().casefold())
+
+
+def venue_topic(venue_id):
+    return ('venue', int(venue_id))
+
+
+class HubFull(Exception):
+    pass
+
+
+class Subscription(object):
+    # bounded queue of events for one client. when the client falls
+    # behind the oldest events are dropped and counted
+
+    def __init__(self, topics, max_events):
+        self.topics = topics
+        self.closed = False
+        self.dropped = 0
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def push(self, event):
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event)
+        self._ready.set()
+
+    def wait(self, timeout):
+        # returns (events, dropped since the last call), both empty after
+        # <timeout> seconds without events
+        self._ready.wait(timeout)
+        self._ready.clear()
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+
+class Hub(object):
+
+    def __init__(self, max_subscribers=10000, queue_size=100):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self._topics = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self.published = 0
+
+    def subscribe(self, topics=None):
+        topics = tuple(topics or ()) or (ALL,)
+        subscription = Subscription(topics, self.queue_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise HubFull('%d subscribers' % self._count)
+            self._count += 1
+            for topic in topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        # safe to call more than once
+        with self._lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            self._count -= 1
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    def publish(self, topics, name, data):
+        # delivers one event to every subscriber of any of <topics> (and
+        # to the unfiltered ones), once each
+        with self._lock:
+            self._sequence += 1
+            self.published += 1
+            event = (self._sequence, name, data)
+            receivers = set(self._topics.get(ALL, ()))
+            for topic in topics:
+                receivers.update(self._topics.get(topic, ()))
+        for subscription in receivers:
+            subscription.push(event)
+        return len(receivers)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "subscribers": self._count,
+                "topics": len(self._topics),
+                "published": self.published,
+            }
+
+
+def format_event(event_id, name, data):
+    return 'id: %d\nevent: %s\ndata: %s\n\n' % (
+        event_id, name, json.dumps(data, sort_keys=True))
+
+
+def stream(hub, subscription, heartbeat):
+    # text/event-stream body: events as they are published, a comment line
+    # every <heartbeat> idle seconds (keeps proxies from closing the
+    # connection and lets a gone client be noticed) and a "dropped" event
+    # when the queue overflowed. unsubscribes when the client disconnects
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            events, dropped = subscription.wait(heartbeat)
+            if dropped:
+                yield 'event: dropped\ndata: %s\n\n' % json.dumps(
+                    {"count": dropped})
+            if not events and not dropped:
+                yield ': heartbeat\n\n'
+            for event_id, name, data in events:
+                yield format_event(event_id, name, data)
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,105 @@
+# small concurrent load generator for comparing worker setups.
+#   $ python loadtest.py http://localhost:5000 --concurrency 50 --duration 20
+# hits the venue/artist detail pages and the two search routes and prints
+# throughput and latency percentiles per route
+import argparse
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+CSRF = re.compile(r'name="csrf_token" value="([^"]+)"')
+
+
+def make_opener(base_url):
+    # search is a csrf protected POST, so every client keeps a session
+    # cookie and the token from a page that renders the search box
+    opener = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(CookieJar()))
+    page = opener.open(base_url + '/venues').read().decode('utf-8')
+    match = CSRF.search(page)
+    return opener, match.group(1) if match else ''
+
+
+def targets(args):
+    return [
+        ('venue detail', 'GET', '/venues/%d' % args.venue_id, None),
+        ('artist detail', 'GET', '/artists/%d' % args.artist_id, None),
+        ('venue search', 'POST', '/venues/search', args.term),
+        ('artist search', 'POST', '/artists/search', args.term),
+    ]
+
+
+def client(args, deadline, timings, errors, lock):
+    opener, token = make_opener(args.url)
+    routes = targets(args)
+    turn = 0
+    while time.time() < deadline:
+        name, method, path, term = routes[turn % len(routes)]
+        turn += 1
+        data = None
+        if method == 'POST':
+            data = urllib.parse.urlencode(
+                {'search_term': term, 'csrf_token': token}).encode('utf-8')
+        started = time.time()
+        try:
+            opener.open(args.url + path, data=data, timeout=30).read()
+        except Exception:
+            with lock:
+                errors[name] = errors.get(name, 0) + 1
+            continue
+        with lock:
+            timings.setdefault(name, []).append(time.time() - started)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Concurrent load test for the detail and search routes.')
+    parser.add_argument('url')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--venue-id', type=int, default=1)
+    parser.add_argument('--artist-id', type=int, default=1)
+    parser.add_argument('--term', default='music')
+    args = parser.parse_args()
+    args.url = args.url.rstrip('/')
+
+    timings = {}
+    errors = {}
+    lock = threading.Lock()
+    deadline = time.time() + args.duration
+    threads = [threading.Thread(target=client,
+                                args=(args, deadline, timings, errors, lock))
+               for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print('%d clients for %.0fs against %s' %
+          (args.concurrency, args.duration, args.url))
+    print('%-14s %8s %8s %8s %8s %6s' %
+          ('route', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'))
+    for name, _, _, _ in targets(args):
+        values = timings.get(name, [])
+        if not values:
+            print('%-14s %8s %8s %8s %8s %6d' %
+                  (name, '-', '-', '-', '-', errors.get(name, 0)))
+            continue
+        print('%-14s %8.1f %8.1f %8.1f %8.1f %6d' % (
+            name, len(values) / args.duration,
+            percentile(values, 0.50) * 1000,
+            percentile(values, 0.95) * 1000,
+            percentile(values, 0.99) * 1000,
+            errors.get(name, 0)))
+
+
+if __name__ == '__main__':
+    main()
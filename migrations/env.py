@@ -1,6 +1,8 @@
 from __future__ import with_statement
 
 import logging
+import os
+import sys
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -17,6 +19,9 @@ config = context.config
 fileConfig(config.config_file_name)
 logger = logging.getLogger('alembic.env')
 
+# lets revision scripts `from online import ...` (see online.py)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
@@ -78,11 +83,16 @@ def run_migrations_online():
         poolclass=pool.NullPool,
     )
 
+    # bookkeeping of online.backfill, not part of the models
+    def include_object(object, name, type_, reflected, compare_to):
+        return not (type_ == 'table' and name == 'online_migration_progress')
+
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
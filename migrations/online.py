@@ -0,0 +1,151 @@
+"""Helpers for migrations that run against large, live tables.
+
+Revision scripts can import them directly (env.py puts this directory on
+sys.path)::
+
+    from online import backfill, create_index_concurrently, lock_timeout
+
+A column change then ships in small steps that never hold a long lock:
+
+1. ``op.add_column`` with a nullable column and no default, which only
+   touches the catalog, inside ``lock_timeout()``.
+2. ``create_index_concurrently`` for any index the new column needs.
+3. ``backfill`` to fill existing rows in small, committed batches.
+4. A later revision adds NOT NULL or constraints once the data is there.
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+from alembic import op
+
+logger = logging.getLogger('alembic.online')
+
+PROGRESS_TABLE = 'online_migration_progress'
+
+
+def is_postgres():
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+@contextmanager
+def lock_timeout(timeout='5s'):
+    """Fail DDL fast instead of queueing behind (and blocking) traffic.
+
+    An ALTER TABLE that waits for a lock blocks every query behind it, so
+    it is better to give up and retry the deploy than to stall the site.
+    """
+    if is_postgres():
+        op.execute("SET LOCAL lock_timeout = '%s'" % timeout)
+    yield
+
+
+def create_index_concurrently(name, table, columns, unique=False):
+    """Build an index without blocking writes (PostgreSQL).
+
+    CREATE INDEX CONCURRENTLY cannot run inside a transaction, so it runs
+    in an autocommit block. A failed concurrent build leaves an invalid
+    index behind; it is dropped and rebuilt when the migration is retried.
+    In offline (--sql) mode there is no database to ask, so the script
+    drops any leftover index and builds it again.
+    """
+    if not is_postgres():
+        op.create_index(name, table, columns, unique=unique)
+        return
+    with op.get_context().autocommit_block():
+        if op.get_context().as_sql:
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS "%s"' % name)
+            op.create_index(name, table, columns, unique=unique,
+                            postgresql_concurrently=True)
+            return
+        bind = op.get_bind()
+        valid = bind.execute(sa.text(
+            'SELECT i.indisvalid FROM pg_index i '
+            'JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name'
+        ), {'name': name}).scalar()
+        if valid:
+            logger.info('index %s already exists', name)
+            return
+        if valid is False:
+            logger.info('dropping invalid index %s left by a failed build', name)
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS "%s"' % name)
+        op.create_index(name, table, columns, unique=unique,
+                        postgresql_concurrently=True)
+
+
+def drop_index_concurrently(name, table):
+    if not is_postgres():
+        op.drop_index(name, table_name=table)
+        return
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS "%s"' % name)
+
+
+def backfill(name, table, set_clause, where=None, key='id', batch_size=1000,
+             rows_per_second=None, pause=0.0):
+    """Run ``UPDATE <table> SET <set_clause>`` in key ranges.
+
+    Every batch covers ``batch_size`` consecutive values of ``key`` (an
+    indexed, unique integer column) and commits on its own, so locks are
+    held for one batch only. The last finished key is stored under
+    ``name`` in the online_migration_progress table, so an interrupted
+    backfill resumes where it stopped. Because a batch can be repeated
+    after a crash, ``set_clause`` must be idempotent. Rows inserted after
+    the backfill started are not visited, so deploy the application code
+    that writes the new form before running it.
+
+    ``rows_per_second`` caps the update rate and ``pause`` adds a fixed
+    sleep between batches, to keep replication lag and I/O in check.
+    """
+    if op.get_context().as_sql:
+        raise RuntimeError('backfill %s needs a live connection, it cannot '
+                           'run in offline (--sql) mode' % name)
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        progress = sa.table(PROGRESS_TABLE, sa.column('name'),
+                            sa.column('last_key'))
+        ensure_progress_table(bind)
+        start = bind.execute(
+            sa.select([progress.c.last_key]).where(progress.c.name == name)
+        ).scalar()
+        if start is None:
+            start = (bind.execute(sa.text(
+                'SELECT min("%s") FROM "%s"' % (key, table))).scalar() or 1) - 1
+            bind.execute(progress.insert().values(name=name, last_key=start))
+        end = bind.execute(sa.text(
+            'SELECT max("%s") FROM "%s"' % (key, table))).scalar() or 0
+        update = sa.text(
+            'UPDATE "%s" SET %s WHERE "%s" > :low AND "%s" <= :high%s'
+            % (table, set_clause, key, key,
+               ' AND (%s)' % where if where else ''))
+
+        total = 0
+        started = time.monotonic()
+        low = start
+        while low < end:
+            high = min(low + batch_size, end)
+            batch_started = time.monotonic()
+            total += bind.execute(update, {'low': low, 'high': high}).rowcount
+            bind.execute(progress.update().where(progress.c.name == name).
+                         values(last_key=high))
+            low = high
+            elapsed = time.monotonic() - started
+            logger.info('backfill %s: %s %d/%d (%.1f%%), %d rows updated, '
+                        '%.0f rows/s', name, key, high, end,
+                        100.0 * (high - start) / max(1, end - start), total,
+                        total / elapsed if elapsed else 0)
+            sleep = pause
+            if rows_per_second:
+                budget = float(batch_size) / rows_per_second
+                sleep = max(sleep, budget - (time.monotonic() - batch_started))
+            if sleep > 0 and low < end:
+                time.sleep(sleep)
+    return total
+
+
+def ensure_progress_table(bind):
+    if not sa.inspect(bind).has_table(PROGRESS_TABLE):
+        bind.execute(sa.text(
+            'CREATE TABLE %s (name VARCHAR(200) PRIMARY KEY, '
+            'last_key BIGINT NOT NULL)' % PROGRESS_TABLE))
@@ -0,0 +1,37 @@
+"""empty message
+
+Revision ID: 0a9d4e7c5b18
+Revises: f2b7c9d31e04
+Create Date: 2026-10-19 17:42:08.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online import create_index_concurrently, drop_index_concurrently, \
+    lock_timeout
+
+
+# revision identifiers, used by Alembic.
+revision = '0a9d4e7c5b18'
+down_revision = 'f2b7c9d31e04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # fingerprints of existing rows are computed in python by
+    # `flask merge-duplicates`, which also merges the duplicates it finds
+    with lock_timeout():
+        op.add_column('Artist', sa.Column('fingerprint', sa.String(length=40), nullable=True))
+        op.add_column('Venue', sa.Column('fingerprint', sa.String(length=40), nullable=True))
+    create_index_concurrently('ix_Artist_fingerprint', 'Artist', ['fingerprint'])
+    create_index_concurrently('ix_Venue_fingerprint', 'Venue', ['fingerprint'])
+
+
+def downgrade():
+    drop_index_concurrently('ix_Venue_fingerprint', 'Venue')
+    drop_index_concurrently('ix_Artist_fingerprint', 'Artist')
+    with lock_timeout():
+        op.drop_column('Venue', 'fingerprint')
+        op.drop_column('Artist', 'fingerprint')
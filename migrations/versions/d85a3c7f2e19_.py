@@ -0,0 +1,33 @@
+"""empty message
+
+Revision ID: d85a3c7f2e19
+Revises: c47d2e9a1b60
+Create Date: 2026-10-19 11:58:50.114736
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online import create_index_concurrently, drop_index_concurrently, \
+    lock_timeout
+
+
+# revision identifiers, used by Alembic.
+revision = 'd85a3c7f2e19'
+down_revision = 'c47d2e9a1b60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with lock_timeout():
+        op.add_column('Show', sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True))
+        op.add_column('ShowArchive', sa.Column('created_at', sa.DateTime(), nullable=True))
+    create_index_concurrently('ix_Show_created_at', 'Show', ['created_at'])
+
+
+def downgrade():
+    drop_index_concurrently('ix_Show_created_at', 'Show')
+    with lock_timeout():
+        op.drop_column('ShowArchive', 'created_at')
+        op.drop_column('Show', 'created_at')
@@ -0,0 +1,34 @@
+"""empty message
+
+Revision ID: e1f6a8b94c32
+Revises: d85a3c7f2e19
+Create Date: 2026-10-19 14:20:33.671058
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f6a8b94c32'
+down_revision = 'd85a3c7f2e19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # keyset pagination sorts by coalesce(<column>, ''), see
+    # pagination.sort_key
+    create_index_concurrently('ix_Artist_city_id', 'Artist', [sa.text("coalesce(city, '')"), 'id'])
+    create_index_concurrently('ix_Artist_name_id', 'Artist', [sa.text("coalesce(name, '')"), 'id'])
+    create_index_concurrently('ix_Artist_state_city_id', 'Artist', ['state', sa.text("coalesce(city, '')"), 'id'])
+    create_index_concurrently('ix_Artist_state_name_id', 'Artist', ['state', sa.text("coalesce(name, '')"), 'id'])
+
+
+def downgrade():
+    drop_index_concurrently('ix_Artist_state_name_id', 'Artist')
+    drop_index_concurrently('ix_Artist_state_city_id', 'Artist')
+    drop_index_concurrently('ix_Artist_name_id', 'Artist')
+    drop_index_concurrently('ix_Artist_city_id', 'Artist')
@@ -0,0 +1,83 @@
+# keyset ("seek") pagination: pages are addressed by the sort key of the
+# row next to them instead of an OFFSET, so every page costs one index
+# range scan no matter how deep into the listing it is
+import base64
+import json
+
+from sqlalchemy import func, literal_column, tuple_
+
+
+def sort_key(column):
+    # the value rows are ordered and compared by: NULL becomes '' so rows
+    # without a value come first instead of dropping out of the listing.
+    # the '' is inlined (not a bound parameter) so the expression matches
+    # the coalesce indexes on the sorted columns
+    return func.coalesce(column, literal_column("''"))
+
+
+def encode_cursor(value, record_id):
+    raw = json.dumps([value, record_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    # returns (value, id), or None for a missing cursor. raises ValueError
+    # for a mangled one, including a value that is not a string or number,
+    # so it never reaches the database
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, record_id = json.loads(raw.decode('utf-8'))
+        record_id = int(record_id)
+    except (ValueError, TypeError):
+        raise ValueError('invalid cursor')
+    if isinstance(value, bool) or \
+            not isinstance(value, (str, int, float)):
+        raise ValueError('invalid cursor')
+    return value, record_id
+
+
+class KeysetPage(object):
+
+    def __init__(self, items, next_cursor, prev_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def keyset_page(query, sort_column, id_column, per_page, after=None,
+                before=None):
+    # <query> must select <sort_column> and <id_column> as attributes named
+    # like the columns. <after>/<before> are cursors from a previous page;
+    # a mangled one raises ValueError. rows are walked in sort_key() order,
+    # so a NULL <sort_column> sorts like an empty string
+    after = decode_cursor(after)
+    before = decode_cursor(before)
+    sort_value = sort_key(sort_column)
+    key = tuple_(sort_value, id_column)
+    if before:
+        rows = query.filter(key < tuple_(*before)).\
+            order_by(sort_value.desc(), id_column.desc()).\
+            limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        has_next, has_prev = True, has_more
+    else:
+        if after:
+            query = query.filter(key > tuple_(*after))
+        rows = query.order_by(sort_value, id_column).\
+            limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = after is not None
+
+    def cursor(row):
+        value = getattr(row, sort_column.key)
+        return encode_cursor('' if value is None else value,
+                             getattr(row, id_column.key))
+
+    return KeysetPage(
+        rows,
+        cursor(rows[-1]) if rows and has_next else None,
+        cursor(rows[0]) if rows and has_prev else None)
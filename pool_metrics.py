@@ -0,0 +1,151 @@
+# connection pool instrumentation for the /metrics endpoint
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+
+class PoolStats(object):
+    # counters of one engine, fed by TimedQueuePool and the pool events
+    # below
+
+    def __init__(self, samples=1000):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=samples)
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        # connection record -> when it was checked out, for the ones
+        # checked out right now
+        self._checked_out = {}
+        # connection record -> when its database connection was opened,
+        # for the ones open right now
+        self._open = {}
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self._waits.append(seconds)
+            self.wait_count += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def opened(self, connection_record, connected_at):
+        with self._lock:
+            self.connects += 1
+            self._open[connection_record] = connected_at
+
+    def closed(self, connection_record):
+        with self._lock:
+            self._open.pop(connection_record, None)
+
+    def checked_out(self, connection_record):
+        with self._lock:
+            self.checkouts += 1
+            self._checked_out[connection_record] = time.monotonic()
+
+    def checked_in(self, connection_record):
+        with self._lock:
+            self.checkins += 1
+            self._checked_out.pop(connection_record, None)
+
+    def snapshot(self, pool):
+        with self._lock:
+            waits = sorted(self._waits)
+            # how long the longest held connection has been checked out;
+            # one that keeps growing is a leak or a stuck request
+            held = min(self._checked_out.values()) \
+                if self._checked_out else None
+            # how long ago the oldest open connection was made
+            oldest = min(self._open.values()) if self._open else None
+            now = time.monotonic()
+            data = {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "checkout_timeouts": self.timeouts,
+                "wait_avg_ms": (self.wait_total / self.wait_count * 1000
+                                if self.wait_count else 0.0),
+                "wait_max_ms": self.wait_max * 1000,
+                "wait_p95_ms": (waits[int(len(waits) * 0.95)] * 1000
+                                if waits else 0.0),
+                "open_connections": len(self._open),
+                "connection_age_max_s": now - oldest
+                if oldest is not None else 0.0,
+                "checkout_held_max_s": now - held
+                if held is not None else 0.0
+            }
+        if isinstance(pool, QueuePool):
+            data.update({
+                "size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+            })
+        return data
+
+
+class TimedQueuePool(QueuePool):
+    # QueuePool that records how long each checkout waited for a free
+    # connection, including the ones that gave up after pool_timeout.
+    # instrument() sets <stats>
+
+    stats = None
+
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            connection = super(TimedQueuePool, self)._do_get()
+        except exc.TimeoutError:
+            if self.stats is not None:
+                self.stats.record_wait(time.monotonic() - started,
+                                       timed_out=True)
+            raise
+        if self.stats is not None:
+            self.stats.record_wait(time.monotonic() - started)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool, keep counting into the
+        # same stats
+        pool = super(TimedQueuePool, self).recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def instrument(engine):
+    # returns the PoolStats of <engine>
+    stats = PoolStats()
+    if isinstance(engine.pool, TimedQueuePool):
+        engine.pool.stats = stats
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        connection_record.info['connected_at'] = time.monotonic()
+        stats.opened(connection_record,
+                     connection_record.info['connected_at'])
+
+    @event.listens_for(engine, 'close')
+    def on_close(dbapi_connection, connection_record):
+        stats.closed(connection_record)
+
+    @event.listens_for(engine, 'detach')
+    def on_detach(dbapi_connection, connection_record):
+        stats.closed(connection_record)
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.checked_out(connection_record)
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        stats.checked_in(connection_record)
+
+    return stats
@@ -0,0 +1,221 @@
+# on-demand request profiling. a profiled request is sampled from a
+# background thread (its Python stack every PROFILE_INTERVAL_MS) and the
+# samples are written to PROFILE_DIR as collapsed stacks, which speedscope
+# (https://www.speedscope.app) and flamegraph.pl open directly, next to a
+# JSON summary that splits the time into SQL, view code, template
+# rendering and any extra markers
+import hmac
+import inspect
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from flask import abort, g, render_template, request, send_from_directory
+from flask.templating import _render
+from sqlalchemy.engine import Connection
+
+PROFILE_HEADER = 'X-Fyyur-Profile'
+
+# time spent below one of these functions is attributed to its category;
+# the innermost match on a stack wins. every statement, whatever the
+# dialect, is sent and waited on inside Connection._execute_context
+DEFAULT_MARKERS = {
+    'sql': [Connection._execute_context],
+    'jinja': [_render],
+}
+
+
+class StackSampler(object):
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler',
+                                        daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self.samples
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                # root first
+                self.samples[tuple(reversed(stack))] += 1
+
+
+def frame_name(code):
+    # "function (package/module.py:line)"; collapsed stacks use ; as the
+    # separator so it must not appear in a frame name
+    parts = code.co_filename.replace('\\', '/').split('/')
+    filename = '/'.join(parts[-2:])
+    return ('%s (%s:%d)' % (code.co_name, filename,
+                            code.co_firstlineno)).replace(';', ',')
+
+
+def collapsed(samples):
+    return ''.join('%s %d\n' % (';'.join(frame_name(code) for code in stack),
+                                count)
+                   for stack, count in samples.most_common())
+
+
+def breakdown(samples, markers, duration):
+    # milliseconds per category: each category's share of the samples
+    # applied to the measured duration (the sampler only runs when it gets
+    # the GIL, so counting samples times the interval would undercount).
+    # samples outside every marker but inside the view are "view", the
+    # rest (routing, hooks, wsgi) "framework"
+    categories = {}
+    for category, functions in markers.items():
+        for function in functions:
+            categories[inspect.unwrap(function).__code__] = category
+    totals = Counter()
+    for stack, count in samples.items():
+        category = 'framework'
+        for code in reversed(stack):
+            if code in categories:
+                category = categories[code]
+                break
+        totals[category] += count
+    total = sum(totals.values()) or 1
+    return dict((category, round(duration * 1000 * count / total, 1))
+                for category, count in totals.items())
+
+
+def write_profile(directory, name, samples, summary, keep):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(os.path.join(directory, name + '.txt'), 'w') as f:
+        f.write(collapsed(samples))
+    with open(os.path.join(directory, name + '.json'), 'w') as f:
+        json.dump(summary, f, sort_keys=True)
+    for old in recent_profiles(directory)[keep:]:
+        for extension in ('.txt', '.json'):
+            path = os.path.join(directory, old['name'] + extension)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def recent_profiles(directory, limit=None):
+    # summaries, newest first
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((filename[:-5] for filename in os.listdir(directory)
+                    if filename.endswith('.json')), reverse=True)
+    profiles = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(directory, name + '.json')) as f:
+                profiles.append(dict(json.load(f), name=name))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def recorded_path():
+    # the path and query string without ?profile=, so the token is never
+    # written to disk
+    query = urlencode([(name, value) for name, value in
+                       request.args.items(multi=True) if name != 'profile'])
+    return request.path + ('?' + query if query else '')
+
+
+def install_profiler(app, markers=None):
+    # PROFILING turns the hook on. a request is then profiled when it
+    # carries PROFILE_TOKEN in the X-Fyyur-Profile header or ?profile=,
+    # or at random with probability PROFILE_SAMPLING. recent profiles are
+    # listed at /_profiles (same token required)
+    if not app.config['PROFILING']:
+        return
+    all_markers = dict(DEFAULT_MARKERS)
+    all_markers.update(markers or {})
+    directory = app.config['PROFILE_DIR']
+    interval = app.config['PROFILE_INTERVAL_MS'] / 1000.0
+
+    def has_token():
+        token = app.config['PROFILE_TOKEN']
+        supplied = request.headers.get(PROFILE_HEADER) or \
+            request.args.get('profile')
+        return bool(token and supplied) and \
+            hmac.compare_digest(supplied, token)
+
+    @app.before_request
+    def start_profile():
+        if request.endpoint in ('profiles', 'profile_file', 'static'):
+            return
+        if has_token() or random.random() < app.config['PROFILE_SAMPLING']:
+            g.profiler = StackSampler(threading.get_ident(), interval)
+            g.profiler.start()
+
+    @app.after_request
+    def finish_profile(response):
+        sampler = g.pop('profiler', None)
+        if sampler is None:
+            return response
+        samples = sampler.stop()
+        view_markers = dict(all_markers)
+        view = app.view_functions.get(request.endpoint)
+        if view is not None:
+            view_markers['view'] = [view]
+        started = time.strftime('%Y%m%dT%H%M%S')
+        name = '%s-%06d-%s' % (started, random.randrange(10 ** 6),
+                               request.endpoint or 'unknown')
+        summary = {
+            "time": started,
+            "method": request.method,
+            "path": recorded_path(),
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "duration_ms": round(sampler.duration * 1000, 1),
+            "samples": sum(samples.values()),
+            "interval_ms": app.config['PROFILE_INTERVAL_MS'],
+            "breakdown_ms": breakdown(samples, view_markers,
+                                      sampler.duration)
+        }
+        try:
+            write_profile(directory, name, samples, summary,
+                          app.config['PROFILE_KEEP'])
+            response.headers['X-Fyyur-Profile-Name'] = name
+        except OSError:
+            app.logger.exception('writing profile %s failed', name)
+        return response
+
+    @app.teardown_request
+    def stop_profile(exc):
+        # after_request does not run when the request failed hard
+        sampler = g.pop('profiler', None)
+        if sampler is not None:
+            sampler.stop()
+
+    @app.route('/_profiles')
+    def profiles():
+        if not has_token():
+            abort(403)
+        return render_template('pages/profiles.html',
+                               profiles=recent_profiles(directory, 100),
+                               token=request.args.get('profile', ''))
+
+    @app.route('/_profiles/<name>.txt')
+    def profile_file(name):
+        if not has_token():
+            abort(403)
+        return send_from_directory(directory, name + '.txt',
+                                   mimetype='text/plain')
@@ -0,0 +1,17 @@
+# read-only row projections for list views.
+# list and search pages only print a few columns, so they select just
+# those columns with Core and map each row onto a namedtuple: no ORM
+# instance, no identity map entry, no attribute state to track
+from collections import namedtuple
+
+NamedItem = namedtuple('NamedItem', ['id', 'name'])
+VenueListItem = namedtuple('VenueListItem', ['id', 'name', 'city', 'state'])
+ShowListItem = namedtuple('ShowListItem', [
+    'venue_id', 'venue_name', 'artist_id', 'artist_name',
+    'artist_image_link', 'start_time'
+])
+
+
+def fetch(session, item_class, statement):
+    # <statement> must select the columns in item_class field order
+    return [item_class._make(row) for row in session.execute(statement)]
@@ -0,0 +1,118 @@
+# records the query plans of every SELECT a route issues and compares them
+# against a golden file, see `flask check-plans`
+import json
+import re
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+WHITESPACE = re.compile(r'\s+')
+
+
+@contextmanager
+def capture_selects(engine):
+    # collects (statement, parameters) of the SELECTs run inside the block
+    # by this thread. background threads (name refresher, home panels)
+    # query the same engine at any time and are left out
+    captured = []
+    thread = threading.get_ident()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        if not executemany and threading.get_ident() == thread and \
+                statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def postgres_plan(cursor, statement, parameters):
+    cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]['Plan']
+    full_scans = []
+
+    def shape(node):
+        label = node['Node Type']
+        if 'Relation Name' in node:
+            label += ' on ' + node['Relation Name']
+        if 'Index Name' in node:
+            label += ' using ' + node['Index Name']
+        if node['Node Type'] == 'Seq Scan':
+            full_scans.append(node.get('Relation Name'))
+        children = [shape(child) for child in node.get('Plans', [])]
+        return label + ('(' + ', '.join(children) + ')' if children else '')
+
+    return {
+        "shape": shape(root),
+        "cost": root['Total Cost'],
+        "full_scans": sorted(full_scans)
+    }
+
+
+def sqlite_plan(cursor, statement, parameters):
+    # SQLite has no cost estimate, only the shape is compared. every SCAN
+    # visits the whole table, also one walking a (covering) index; only
+    # SEARCH lines use an index to narrow the rows
+    cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+    details = [row[-1] for row in cursor.fetchall()]
+    full_scans = [detail.split()[1] for detail in details
+                  if detail.startswith('SCAN ')
+                  and 'CONSTANT ROW' not in detail]
+    return {
+        "shape": '; '.join(details),
+        "cost": None,
+        "full_scans": sorted(full_scans)
+    }
+
+
+def explain(engine, captured):
+    # one entry per distinct statement text, in the order they ran
+    explainer = postgres_plan if engine.dialect.name == 'postgresql' \
+        else sqlite_plan
+    plans = {}
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for statement, parameters in captured:
+            key = WHITESPACE.sub(' ', statement).strip()
+            if key not in plans:
+                plans[key] = explainer(cursor, statement, parameters)
+        cursor.close()
+    finally:
+        connection.close()
+    return plans
+
+
+def compare(golden, current, tolerance):
+    # returns a list of human readable regressions, empty when all is well
+    problems = []
+    for route, plans in sorted(current.items()):
+        expected = golden.get(route)
+        if expected is None:
+            problems.append('%s: no golden plans, run with --update' % route)
+            continue
+        for statement, plan in plans.items():
+            before = expected.get(statement)
+            if before is None:
+                problems.append('%s: new statement %s' % (route, statement))
+                continue
+            new_scans = sorted(set(plan['full_scans']) -
+                               set(before['full_scans']))
+            if new_scans:
+                problems.append('%s: full scan of %s in %s\n  was: %s\n  now: %s'
+                                % (route, ', '.join(new_scans), statement,
+                                   before['shape'], plan['shape']))
+            if plan['cost'] is not None and before['cost'] is not None and \
+                    plan['cost'] > before['cost'] * (1 + tolerance):
+                problems.append('%s: cost %.1f -> %.1f in %s'
+                                % (route, before['cost'], plan['cost'],
+                                   statement))
+    return problems
@@ -0,0 +1,184 @@
+# token bucket rate limiting for expensive routes
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import Response, current_app, request
+
+
+def refill(tokens, updated, rate, capacity, now):
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+def take_tokens(buckets):
+    # [(tokens, rate)] of the buckets one request needs a token from.
+    # returns (allowed, tokens left per bucket, seconds until every bucket
+    # has a token). nothing is taken unless every bucket has one, so a
+    # request refused by one bucket does not drain the others
+    waits = [(1 - tokens) / rate for tokens, rate in buckets if tokens < 1]
+    if waits:
+        return False, [tokens for tokens, _ in buckets], max(waits)
+    return True, [tokens - 1 for tokens, _ in buckets], 0.0
+
+
+class MemoryBuckets(object):
+    # buckets of this process only, each gunicorn worker limits separately
+
+    def __init__(self, max_keys=100000):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.max_keys = max_keys
+
+    def take(self, scopes, now=None):
+        # <scopes> is [(key, (rate, capacity))], see take_tokens
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            buckets = []
+            for key, (rate, capacity) in scopes:
+                tokens, updated = self._buckets.get(key, (capacity, now))[:2]
+                buckets.append((refill(tokens, updated, rate, capacity, now),
+                                rate))
+            allowed, left, retry_after = take_tokens(buckets)
+            for (key, (rate, capacity)), tokens in zip(scopes, left):
+                self._buckets[key] = (tokens, now, rate, capacity)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now):
+        # a bucket that has refilled completely is the same as no bucket
+        for key, bucket in list(self._buckets.items()):
+            tokens, updated, rate, capacity = bucket
+            if refill(tokens, updated, rate, capacity, now) >= capacity:
+                del self._buckets[key]
+
+
+class SQLiteBuckets(object):
+    # buckets in a SQLite file shared by all workers on the host. rows
+    # untouched for <max_idle> seconds have refilled completely and are
+    # deleted every <prune_every> seconds
+
+    def __init__(self, path, max_idle=3600, prune_every=60):
+        self.path = path
+        self.max_idle = max_idle
+        self.prune_every = prune_every
+        self._pruned = time.time()
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS buckets '
+            '(key TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def take(self, scopes, now=None):
+        # wall clock time, monotonic clocks are not comparable across
+        # processes
+        now = time.time() if now is None else now
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            buckets = []
+            for key, (rate, capacity) in scopes:
+                row = connection.execute(
+                    'SELECT tokens, updated FROM buckets WHERE key = ?',
+                    (key,)).fetchone()
+                tokens, updated = row if row else (capacity, now)
+                buckets.append((refill(tokens, updated, rate, capacity, now),
+                                rate))
+            allowed, left, retry_after = take_tokens(buckets)
+            connection.executemany(
+                'INSERT OR REPLACE INTO buckets (key, tokens, updated) '
+                'VALUES (?, ?, ?)',
+                [(key, tokens, now) for (key, _), tokens in zip(scopes, left)])
+            if now - self._pruned >= self.prune_every:
+                self._pruned = now
+                connection.execute('DELETE FROM buckets WHERE updated < ?',
+                                   (now - self.max_idle,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return allowed, retry_after
+
+
+def client_address(trusted_proxies):
+    # the client's address. behind <trusted_proxies> reverse proxies it is
+    # the one the outermost of them appended to X-Forwarded-For; entries
+    # further left are whatever the client sent and cannot be trusted
+    if trusted_proxies:
+        forwarded = [address.strip() for address in
+                     request.headers.get('X-Forwarded-For', '').split(',')
+                     if address.strip()]
+        if len(forwarded) >= trusted_proxies:
+            return forwarded[-trusted_proxies]
+    return request.remote_addr or '-'
+
+
+def max_idle(limits):
+    # seconds after which every bucket of <limits> has refilled completely
+    return max([capacity / rate for scopes in limits.values()
+                for rate, capacity in scopes.values()] or [0])
+
+
+class RateLimiter(object):
+    # RATE_LIMITS maps a limit name to its buckets, e.g.
+    #   {'venue_search': {'per_client': (2, 10), 'global': (50, 100)}}
+    # where each pair is (tokens per second, bucket capacity).
+    # RATE_LIMIT_STORAGE is None for process memory or a SQLite file path.
+    # RATE_LIMIT_TRUSTED_PROXIES is the number of reverse proxies in front
+    # of the app, whose X-Forwarded-For entries identify the client
+
+    def __init__(self, app=None):
+        self.buckets = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATE_LIMITS', {})
+        app.config.setdefault('RATE_LIMIT_STORAGE', None)
+        app.config.setdefault('RATE_LIMIT_TRUSTED_PROXIES', 0)
+        storage = app.config['RATE_LIMIT_STORAGE']
+        if storage:
+            self.buckets = SQLiteBuckets(
+                storage, max_idle=max(max_idle(app.config['RATE_LIMITS']),
+                                      3600))
+        else:
+            self.buckets = MemoryBuckets()
+
+    def check(self, name):
+        # returns the Retry-After in seconds, or None when allowed
+        limits = current_app.config['RATE_LIMITS'].get(name, {})
+        scopes = []
+        if 'per_client' in limits:
+            client = client_address(
+                current_app.config['RATE_LIMIT_TRUSTED_PROXIES'])
+            scopes.append((name + ':' + client, limits['per_client']))
+        if 'global' in limits:
+            scopes.append((name + ':*', limits['global']))
+        if not scopes:
+            return None
+        allowed, retry_after = self.buckets.take(scopes)
+        return None if allowed else retry_after
+
+    def limit(self, name):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                retry_after = self.check(name)
+                if retry_after is not None:
+                    return Response(
+                        'Too many requests, please slow down.', 429,
+                        {'Retry-After': str(max(1, int(retry_after + 0.999)))})
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
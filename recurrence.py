@@ -0,0 +1,41 @@
+# expands recurring show bookings into individual occurrences
+from datetime import timedelta
+from itertools import islice
+
+from dateutil.rrule import rrulestr
+
+
+class RecurrenceError(ValueError):
+    # a booking that can't be expanded, the message is safe to show users
+    pass
+
+
+def expand_occurrences(start_time, every_days=None, until=None, rule=None,
+                       limit=366):
+    # returns the list of start times for one booking.
+    # either an RRULE string ("FREQ=WEEKLY;COUNT=52") or a simple
+    # "every N days until <date>" pair can be given, otherwise the booking
+    # is a single show. raises RecurrenceError past <limit> occurrences so a
+    # typo can't book a venue for the next hundred years
+    if rule:
+        try:
+            occurrences = list(islice(rrulestr(rule, dtstart=start_time),
+                                      limit + 1))
+        except (ValueError, TypeError, OverflowError):
+            raise RecurrenceError('repeat rule could not be parsed')
+    elif every_days is not None or until:
+        if every_days is None or not until:
+            raise RecurrenceError(
+                'repeat every and repeat until must be given together')
+        if every_days < 1:
+            raise RecurrenceError('repeat interval must be at least one day')
+        occurrences = []
+        current = start_time
+        while current <= until and len(occurrences) <= limit:
+            occurrences.append(current)
+            current += timedelta(days=every_days)
+    else:
+        occurrences = [start_time]
+    if len(occurrences) > limit:
+        raise RecurrenceError('booking expands to more than %d shows' % limit)
+    return occurrences
@@ -0,0 +1,100 @@
+# show counts per artist genre per month and per venue city per week.
+# schedule_shows adds the shows it inserts in the same transaction, and
+# rebuild() recounts everything (after seeding, merges or edits of a
+# venue's city or an artist's genres), so dashboards read a few small rows
+# instead of scanning shows joined through Venue and Artist
+from collections import Counter
+from datetime import date, timedelta
+
+from sqlalchemy import and_
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def month_of(start_time):
+    return date(start_time.year, start_time.month, 1)
+
+
+def week_of(start_time):
+    # weeks start on Monday
+    day = start_time.date()
+    return day - timedelta(days=day.weekday())
+
+
+def split_genres(genres):
+    return [genre.strip() for genre in (genres or '').split(',')
+            if genre.strip()]
+
+
+def count_shows(rows):
+    # rows of (artist genres, venue city, venue state, start_time) ->
+    # ({(genre, month): shows}, {(city, state, week): shows})
+    genre_months = Counter()
+    city_weeks = Counter()
+    for genres, city, state, start_time in rows:
+        if start_time is None:
+            continue
+        for genre in set(split_genres(genres)):
+            genre_months[(genre, month_of(start_time))] += 1
+        city_weeks[(city or '', state or '', week_of(start_time))] += 1
+    return genre_months, city_weeks
+
+
+def key_columns(table):
+    return [column.name for column in table.primary_key.columns]
+
+
+def add_counts(session, table, counts):
+    # shows += count for every key, inserting missing rows. an upsert on
+    # PostgreSQL and SQLite, so concurrent inserts of a new key cannot
+    # collide; update-then-insert elsewhere
+    if not counts:
+        return
+    keys = key_columns(table)
+    rows = [dict(zip(keys, key), shows=count)
+            for key, count in counts.items()]
+    dialect = session.connection().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = (postgresql if dialect == 'postgresql' else sqlite).\
+            insert(table)
+        session.execute(insert.on_conflict_do_update(
+            index_elements=keys,
+            set_={'shows': table.c.shows + insert.excluded.shows}), rows)
+        return
+    for row in rows:
+        match = and_(*[table.c[key] == row[key] for key in keys])
+        updated = session.execute(table.update().where(match).values(
+            shows=table.c.shows + row['shows'])).rowcount
+        if not updated:
+            session.execute(table.insert(), [row])
+
+
+def replace_counts(session, table, counts, batch_size=5000):
+    # swaps the whole table's contents; the caller commits once, so
+    # readers see either the old or the new counts
+    keys = key_columns(table)
+    session.execute(table.delete())
+    rows = [dict(zip(keys, key), shows=count)
+            for key, count in counts.items()]
+    for start in range(0, len(rows), batch_size):
+        session.execute(table.insert(), rows[start:start + batch_size])
+
+
+def rebuild(session, source, genre_table, city_table, batch_size=10000):
+    # recounts from <source>, a select of (genres, city, state, start_time)
+    # over every show, streamed in batches. returns the number of shows
+    result = session.execute(source.execution_options(stream_results=True))
+    genre_months = Counter()
+    city_weeks = Counter()
+    total = 0
+    while True:
+        rows = result.fetchmany(batch_size)
+        if not rows:
+            break
+        batch_genres, batch_cities = count_shows(rows)
+        genre_months.update(batch_genres)
+        city_weeks.update(batch_cities)
+        total += len(rows)
+    replace_counts(session, genre_table, genre_months)
+    replace_counts(session, city_table, city_weeks)
+    session.commit()
+    return total
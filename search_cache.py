@@ -0,0 +1,93 @@
+# LRU cache of search results, with a memory budget and name-aware
+# invalidation. empty results are cached too, repeated misses are as
+# common as repeated hits
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# rough per-object overheads used to keep the cache within its budget
+ENTRY_OVERHEAD = 200
+ITEM_OVERHEAD = 120
+
+
+def normalize_term(term):
+    return (term or '').strip().lower()
+
+
+def entry_size(term, results):
+    return ENTRY_OVERHEAD + sys.getsizeof(term) + sum(
+        ITEM_OVERHEAD + sys.getsizeof(item.name or '') for item in results)
+
+
+class SearchCache(object):
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, ttl=300):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, kind, term):
+        # returns the cached result list, or None on a miss
+        key = (kind, term)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, kind, term, results):
+        key = (kind, term)
+        size = entry_size(term, results)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (results, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, kind, *names):
+        # drops every cached term that is a substring of one of <names>,
+        # i.e. every search whose result a venue/artist with that name
+        # joins or leaves. pass both the old and the new name on rename
+        names = [normalize_term(name) for name in names if name is not None]
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == kind and any(key[1] in name for name in names):
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, key):
+        self._bytes -= self._entries.pop(key)[1]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,208 @@
+# deterministic synthetic venues, artists and shows for scale testing
+import csv
+import io
+import random
+from bisect import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from sqlalchemy import func, select
+
+from duplicates import fingerprint
+from forms import GENRE_CHOICES
+
+# a few big music cities get most of the catalog
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('San Francisco', 'CA'),
+    ('Chicago', 'IL'), ('Nashville', 'TN'), ('Austin', 'TX'),
+    ('New Orleans', 'LA'), ('Seattle', 'WA'), ('Atlanta', 'GA'),
+    ('Boston', 'MA'), ('Denver', 'CO'), ('Portland', 'OR'),
+    ('Miami', 'FL'), ('Detroit', 'MI'), ('Philadelphia', 'PA'),
+    ('Minneapolis', 'MN'), ('Memphis', 'TN'), ('Oakland', 'CA'),
+    ('Houston', 'TX'), ('Phoenix', 'AZ'),
+]
+# genres listed first in this order are the popular ones
+POPULAR_GENRES = ['Rock n Roll', 'Pop', 'Hip-Hop', 'Jazz', 'Electronic',
+                  'Alternative', 'R&B', 'Folk', 'Country', 'Blues']
+GENRES = POPULAR_GENRES + [name for name, _ in GENRE_CHOICES
+                           if name not in POPULAR_GENRES]
+
+VENUE_WORDS = ['Musical', 'Golden', 'Velvet', 'Blue', 'Electric', 'Rusty',
+               'Silver', 'Midnight', 'Park Square', 'Crimson', 'Lucky',
+               'Copper', 'Neon', 'Hidden', 'Grand']
+VENUE_NOUNS = ['Hop', 'Lounge', 'Hall', 'Room', 'Theatre', 'Club', 'Cellar',
+               'Garden', 'Stage', 'Den', 'Ballroom', 'Tavern']
+ARTIST_WORDS = ['Wild', 'Sax', 'Guns', 'Petals', 'Quiet', 'Loud', 'Static',
+                'Northern', 'Paper', 'Iron', 'Velvet', 'Glass', 'Sunday',
+                'Desert', 'Ocean', 'Neon', 'Electric', 'Lonely']
+ARTIST_NOUNS = ['Band', 'Collective', 'Trio', 'Quartet', 'Orchestra',
+                'Project', 'Kids', 'Machine', 'Society', 'Ghosts']
+
+
+def zipf_weights(count, skew):
+    # cumulative weights where item n is picked ~1/n^skew as often as the
+    # first, so a handful of venues and artists get most of the shows
+    return list(accumulate(1.0 / (rank ** skew) for rank in range(1, count + 1)))
+
+
+def pick(rng, items, cumulative):
+    return items[bisect(cumulative, rng.random() * cumulative[-1])]
+
+
+def pick_genres(rng, genre_weights):
+    chosen = set()
+    for _ in range(rng.randint(1, 3)):
+        chosen.add(pick(rng, GENRES, genre_weights))
+    return ','.join(sorted(chosen))
+
+
+def venue_rows(rng, count, city_skew=1.0, genre_skew=1.0):
+    cities = zipf_weights(len(CITIES), city_skew)
+    genres = zipf_weights(len(GENRES), genre_skew)
+    for number in range(1, count + 1):
+        city, state = pick(rng, CITIES, cities)
+        name = 'The %s %s %d' % (rng.choice(VENUE_WORDS),
+                                 rng.choice(VENUE_NOUNS), number)
+        yield {
+            "name": name,
+            "city": city,
+            "state": state,
+            "address": '%d %s St' % (rng.randint(1, 9999),
+                                     rng.choice(VENUE_WORDS)),
+            "phone": '%03d-%03d-%04d' % (rng.randint(200, 999),
+                                         rng.randint(100, 999),
+                                         rng.randint(0, 9999)),
+            "website": 'https://venue%d.example.com' % number,
+            "genres": pick_genres(rng, genres),
+            "image_link": 'https://images.example.com/venues/%d.jpg' % number,
+            "facebook_link": 'https://www.facebook.com/venue%d' % number,
+            "seeking_talent": rng.random() < 0.3,
+            "seeking_description": None,
+            "fingerprint": fingerprint(name, city, state)
+        }
+
+
+def artist_rows(rng, count, city_skew=1.0, genre_skew=1.0):
+    cities = zipf_weights(len(CITIES), city_skew)
+    genres = zipf_weights(len(GENRES), genre_skew)
+    for number in range(1, count + 1):
+        city, state = pick(rng, CITIES, cities)
+        name = '%s %s %d' % (rng.choice(ARTIST_WORDS),
+                             rng.choice(ARTIST_NOUNS), number)
+        yield {
+            "name": name,
+            "city": city,
+            "state": state,
+            "phone": '%03d-%03d-%04d' % (rng.randint(200, 999),
+                                         rng.randint(100, 999),
+                                         rng.randint(0, 9999)),
+            "website": 'https://artist%d.example.com' % number,
+            "genres": pick_genres(rng, genres),
+            "image_link": 'https://images.example.com/artists/%d.jpg' % number,
+            "facebook_link": 'https://www.facebook.com/artist%d' % number,
+            "seeking_venue": rng.random() < 0.4,
+            "seeking_description": None,
+            "fingerprint": fingerprint(name, city, state)
+        }
+
+
+def show_rows(rng, count, venue_ids, artist_ids, now, years_past=5,
+              upcoming_fraction=0.1, venue_skew=1.2, artist_skew=0.8):
+    # evening shows, mostly in the past, spread over <years_past> years.
+    # venue_ids/artist_ids should be ordered so that the first ones are
+    # the "hot" ones
+    venues = zipf_weights(len(venue_ids), venue_skew)
+    artists = zipf_weights(len(artist_ids), artist_skew)
+    past_days = int(years_past * 365)
+    for _ in range(count):
+        if rng.random() < upcoming_fraction:
+            day = now + timedelta(days=rng.randint(1, 180))
+        else:
+            day = now - timedelta(days=rng.randint(1, past_days))
+        start_time = day.replace(hour=rng.randint(18, 23), minute=0,
+                                 second=0, microsecond=0)
+        yield {
+            "Venue_id": pick(rng, venue_ids, venues),
+            "Artist_id": pick(rng, artist_ids, artists),
+            "start_time": start_time,
+            "created_at": min(now, start_time - timedelta(
+                days=rng.randint(7, 90)))
+        }
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bulk_load(session, table, rows, batch_size=10000, progress=None):
+    # COPY on PostgreSQL, executemany elsewhere. one transaction per batch
+    # so a 10M row load never holds more than <batch_size> rows in memory
+    postgres = session.connection().dialect.name == 'postgresql'
+    total = 0
+    for batch in batched(rows, batch_size):
+        if postgres:
+            copy_batch(session, table, batch)
+        else:
+            session.execute(table.insert(), batch)
+        session.commit()
+        total += len(batch)
+        if progress:
+            progress(table.name, total)
+    return total
+
+
+def copy_batch(session, table, batch):
+    columns = list(batch[0].keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in batch:
+        writer.writerow(['' if row[c] is None else row[c] for c in columns])
+    buffer.seek(0)
+    cursor = session.connection().connection.cursor()
+    cursor.copy_expert(
+        'COPY "%s" (%s) FROM STDIN WITH (FORMAT csv)' % (
+            table.name, ', '.join('"%s"' % c for c in columns)),
+        buffer)
+
+
+def seed(session, venue_table, artist_table, show_table, venues, artists,
+         shows, seed=0, years_past=5, upcoming_fraction=0.1, skew=1.2,
+         batch_size=10000, progress=None, now=None):
+    # the same arguments always produce the same rows (apart from ids when
+    # the tables are not empty), so timings are comparable between runs
+    rng = random.Random(seed)
+    now = now or datetime.now().replace(minute=0, second=0, microsecond=0)
+    first_venue = max_id(session, venue_table) + 1
+    first_artist = max_id(session, artist_table) + 1
+    bulk_load(session, venue_table, venue_rows(rng, venues),
+              batch_size, progress)
+    bulk_load(session, artist_table, artist_rows(rng, artists),
+              batch_size, progress)
+    venue_ids = ids_from(session, venue_table, first_venue)
+    artist_ids = ids_from(session, artist_table, first_artist)
+    # shuffle so the hot venues/artists are spread over the id range
+    rng.shuffle(venue_ids)
+    rng.shuffle(artist_ids)
+    bulk_load(session, show_table,
+              show_rows(rng, shows, venue_ids, artist_ids, now,
+                        years_past=years_past,
+                        upcoming_fraction=upcoming_fraction,
+                        venue_skew=skew, artist_skew=skew * 2 / 3),
+              batch_size, progress)
+
+
+def max_id(session, table):
+    return session.execute(select([func.max(table.c.id)])).scalar() or 0
+
+
+def ids_from(session, table, first_id):
+    return [row[0] for row in session.execute(
+        select([table.c.id]).where(table.c.id >= first_id).
+        order_by(table.c.id))]
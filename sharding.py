@@ -0,0 +1,113 @@
+# optional state-based sharding of venues and their shows.
+# every shard is a complete Fyyur schema holding the venues (and their
+# shows) of one group of states plus a replica of the artists, so the
+# existing joins keep working inside a shard. the primary database keeps
+# the master artist table and the venue directory (venue id -> shard)
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import chain
+
+from sqlalchemy import create_engine
+
+
+def parse_shard_config(binds, states):
+    # "west=sqlite:////tmp/west.db,east=postgresql://..." and
+    # "west=CA,OR,WA;east=NY,NJ" -> dicts, for configuring from env vars
+    groups = {}
+    for item in filter(None, (binds or '').split(',')):
+        group, url = item.split('=', 1)
+        groups[group.strip()] = url.strip()
+    state_groups = {}
+    for item in filter(None, (states or '').split(';')):
+        group, members = item.split('=', 1)
+        state_groups[group.strip()] = [state.strip()
+                                       for state in members.split(',')]
+    return groups, state_groups
+
+
+class ShardRouter(object):
+
+    def __init__(self, app=None):
+        self.engines = {}
+        self.state_groups = {}
+        self.default_group = None
+        self._local = threading.local()
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SHARD_BINDS', {})
+        app.config.setdefault('SHARD_STATES', {})
+        app.config.setdefault('SHARD_DEFAULT', None)
+        for group, url in app.config['SHARD_BINDS'].items():
+            # same pool settings as the primary database
+            options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+                           pool_pre_ping=True)
+            if url.startswith('sqlite'):
+                # scatter-gather reads each shard from a worker thread
+                options['connect_args'] = {'check_same_thread': False}
+            self.engines[group] = create_engine(url, **options)
+        for group, states in app.config['SHARD_STATES'].items():
+            for state in states:
+                self.state_groups[state] = group
+        self.default_group = app.config['SHARD_DEFAULT'] or \
+            (sorted(self.engines)[0] if self.engines else None)
+        if self.engines:
+            self._executor = ThreadPoolExecutor(
+                max_workers=len(self.engines),
+                thread_name_prefix='shard')
+
+    @property
+    def enabled(self):
+        return bool(self.engines)
+
+    @property
+    def groups(self):
+        return sorted(self.engines)
+
+    def group_for_state(self, state):
+        return self.state_groups.get(state, self.default_group)
+
+    @property
+    def current(self):
+        # the shard that Venue/Show statements are routed to right now,
+        # None for the primary database
+        return getattr(self._local, 'group', None)
+
+    @contextmanager
+    def use(self, group):
+        previous = self.current
+        self._local.group = group
+        try:
+            yield
+        finally:
+            self._local.group = previous
+
+    def engine(self):
+        return self.engines[self.current]
+
+    def scatter(self, app, function, cleanup=None):
+        # runs function() once per shard, in parallel, each call with its
+        # own app context and routed to its shard. returns the results in
+        # shard order
+        def run(group):
+            with app.app_context():
+                with self.use(group):
+                    try:
+                        return function()
+                    finally:
+                        if cleanup:
+                            cleanup()
+        return list(self._executor.map(run, self.groups))
+
+    def gather(self, app, function, key=None, reverse=False, cleanup=None):
+        # scatter-gather of a list-returning function. with <key> every
+        # shard's list must already be sorted by it and the lists are
+        # merged, otherwise they are concatenated
+        results = self.scatter(app, function, cleanup)
+        if key is None:
+            return list(chain.from_iterable(results))
+        return list(heapq.merge(*results, key=key, reverse=reverse))
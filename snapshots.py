@@ -0,0 +1,160 @@
+# static HTML snapshots of read-mostly pages. `flask snapshot` renders
+# them through the app into SNAPSHOT_DIR (/venues/3 -> venues/3/index.html)
+# so nginx or the app itself can send the file without running the view.
+# writes remove the snapshots they make stale right away, so those pages
+# are rendered dynamically until a background thread has re-rendered them
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import request, send_file, session
+
+logger = logging.getLogger(__name__)
+
+# sent by the renderer so that it never gets a snapshot back
+RENDER_HEADER = 'X-Fyyur-Snapshot-Render'
+
+
+def snapshot_path(directory, path):
+    return os.path.join(directory, path.strip('/'), 'index.html')
+
+
+def remove_snapshot(directory, path):
+    try:
+        os.remove(snapshot_path(directory, path))
+    except OSError:
+        pass
+
+
+def write_snapshot(directory, path, body):
+    # atomic: readers see the old file or the new one, never a partial one
+    filename = snapshot_path(directory, path)
+    folder = os.path.dirname(filename)
+    if not os.path.isdir(folder):
+        os.makedirs(folder, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    with os.fdopen(handle, 'wb') as f:
+        f.write(body)
+    os.replace(temporary, filename)
+
+
+def render_pages(app, directory, paths):
+    # renders <paths> through the app; a 200 is written, anything else
+    # removes the snapshot. returns the number of pages written
+    client = app.test_client()
+    written = 0
+    for path in paths:
+        response = client.get(path, headers={RENDER_HEADER: '1'})
+        if response.status_code == 200:
+            write_snapshot(directory, path, response.get_data())
+            written += 1
+        else:
+            remove_snapshot(directory, path)
+    return written
+
+
+_worker_app = None
+
+
+def _render_chunk(job):
+    directory, paths = job
+    return render_pages(_worker_app, directory, paths)
+
+
+def render_parallel(app, directory, paths, processes=None, chunk_size=50,
+                    progress=None):
+    # spreads the pages over a pool of forked processes. dispose database
+    # engines before calling this so no connection is shared after fork
+    global _worker_app
+    _worker_app = app
+    chunks = [paths[start:start + chunk_size]
+              for start in range(0, len(paths), chunk_size)]
+    if processes == 1:
+        results = (render_pages(app, directory, chunk) for chunk in chunks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('fork'))
+        results = pool.map(_render_chunk,
+                           [(directory, chunk) for chunk in chunks])
+    total = 0
+    try:
+        for done, written in enumerate(results, 1):
+            total += written
+            if progress:
+                progress(min(done * chunk_size, len(paths)), len(paths))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return total
+
+
+class Regenerator(object):
+    # re-renders pages after writes. changed() removes the stale files at
+    # once and queues the paths; a daemon thread renders the queue after
+    # <delay> seconds, so a burst of writes to one page renders it once
+
+    def __init__(self, app, directory, delay=1.0):
+        self.app = app
+        self.directory = directory
+        self.delay = delay
+        self.rendered = 0
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def changed(self, paths):
+        for path in paths:
+            remove_snapshot(self.directory, path)
+        with self._lock:
+            self._pending.update(paths)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='snapshots', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.delay)
+            self._wakeup.clear()
+            with self._lock:
+                paths, self._pending = sorted(self._pending), set()
+            try:
+                self.rendered += render_pages(self.app, self.directory,
+                                              paths)
+            except Exception:
+                logger.exception('re-rendering %d snapshots failed',
+                                 len(paths))
+
+
+def install_snapshots(app, endpoints):
+    # serves the snapshot of a GET to one of <endpoints> when there is one.
+    # requests with a query string or pending flash messages, and the
+    # renderer's own requests, always go to the view
+    directory = app.config['SNAPSHOT_DIR']
+    if not directory or not app.config['SNAPSHOT_SERVE']:
+        return
+
+    @app.before_request
+    def serve_snapshot():
+        if request.method != 'GET' or request.endpoint not in endpoints or \
+                request.query_string or request.headers.get(RENDER_HEADER) \
+                or '_flashes' in session:
+            return None
+        try:
+            return send_file(snapshot_path(directory, request.path),
+                             mimetype='text/html', cache_timeout=0)
+        except OSError:
+            return None
@@ -0,0 +1,101 @@
+import threading
+import time
+import unittest
+
+from autocomplete import PrefixIndex, IndexRefresher, normalize
+
+
+class PrefixIndexTest(unittest.TestCase):
+
+    def index(self):
+        index = PrefixIndex()
+        index.load([(1, 'The Musical Hop'), (2, 'Park Square Live Music'),
+                    (3, "The Dueling Pianos Bar")])
+        return index
+
+    def test_normalize(self):
+        self.assertEqual(normalize("  The DUELING pianos, Bar! "),
+                         'the dueling pianos bar')
+        self.assertEqual(normalize(None), '')
+
+    def test_matches_full_name_and_each_word(self):
+        index = self.index()
+        self.assertEqual(index.search('the mus'), [(1, 'The Musical Hop')])
+        self.assertEqual(index.search('hop'), [(1, 'The Musical Hop')])
+        self.assertEqual(sorted(index.search('mus')),
+                         [(1, 'The Musical Hop'),
+                          (2, 'Park Square Live Music')])
+
+    def test_search_is_case_and_punctuation_insensitive(self):
+        self.assertEqual(self.index().search('PIANOS,'),
+                         [(3, 'The Dueling Pianos Bar')])
+
+    def test_each_record_is_returned_once(self):
+        index = PrefixIndex()
+        index.load([(1, 'Hop Hop Hooray')])
+        self.assertEqual(index.search('ho'), [(1, 'Hop Hop Hooray')])
+
+    def test_limit_and_empty_prefix(self):
+        index = self.index()
+        self.assertEqual(len(index.search('t', limit=1)), 1)
+        self.assertEqual(index.search(''), [])
+        self.assertEqual(index.search('!!'), [])
+
+    def test_add_replaces_and_remove_drops(self):
+        index = self.index()
+        index.add(1, 'Jazz Cellar')
+        self.assertEqual(index.search('hop'), [])
+        self.assertEqual(index.search('jazz'), [(1, 'Jazz Cellar')])
+        index.remove(1)
+        self.assertEqual(index.search('jazz'), [])
+        index.remove(42)
+
+    def test_reload_keeps_names_added_while_reading(self):
+        index = self.index()
+
+        def read_rows():
+            index.add(4, 'Added Meanwhile')
+            return [(1, 'The Musical Hop')]
+        index.reload(read_rows)
+        self.assertEqual(index.search('meanwhile'), [(4, 'Added Meanwhile')])
+        self.assertEqual(index.search('park'), [])
+        self.assertTrue(index.loaded)
+
+    def test_failed_reload_keeps_the_old_index(self):
+        index = self.index()
+
+        def read_rows():
+            raise RuntimeError('database down')
+        with self.assertRaises(RuntimeError):
+            index.reload(read_rows)
+        self.assertEqual(index.search('park'),
+                         [(2, 'Park Square Live Music')])
+        index.add(5, 'After Failure')
+        index.reload(lambda: [])
+        self.assertEqual(index.search('after'), [])
+
+
+class IndexRefresherTest(unittest.TestCase):
+
+    def test_loads_every_index_on_start(self):
+        loaded = threading.Event()
+        indexes = {'venue': PrefixIndex(), 'artist': PrefixIndex()}
+
+        def read_names(kind):
+            if kind == 'artist':
+                loaded.set()
+            return [(1, kind + ' one')]
+        refresher = IndexRefresher(indexes, read_names, interval=60)
+        refresher.start()
+        refresher.start()
+        self.assertTrue(loaded.wait(timeout=5))
+        for _ in range(100):
+            if indexes['artist'].loaded:
+                break
+            time.sleep(0.01)
+        self.assertEqual(indexes['venue'].search('venue'), [(1, 'venue one')])
+        self.assertEqual(indexes['artist'].search('one'), [(1, 'artist one')])
+
+
+if __name__ == '__main__':
+    unittest.main()
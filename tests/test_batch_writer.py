@@ -0,0 +1,124 @@
+import threading
+import time
+import unittest
+
+from batch_writer import BatchWriter
+
+
+class DatabaseLocked(Exception):
+    pass
+
+
+class RecordingFlush(object):
+    # stands in for flush_show_batch: records every batch it is given and
+    # fails the ones <fail> says should fail
+
+    def __init__(self, fail=None):
+        self.batches = []
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def __call__(self, rows):
+        with self._lock:
+            self.batches.append(list(rows))
+            attempt = len(self.batches)
+        if self.fail is not None:
+            self.fail(rows, attempt)
+        return ['ok:%s' % row for row in rows]
+
+
+class BatchWriterTest(unittest.TestCase):
+
+    def writer(self, flush, **options):
+        writer = BatchWriter(flush, **options)
+        self.addCleanup(writer.close)
+        return writer
+
+    def test_flushes_when_max_rows_is_reached(self):
+        flush = RecordingFlush()
+        writer = self.writer(flush, max_rows=3, max_delay=60)
+        tickets = [writer.submit([number]) for number in range(3)]
+        started = time.monotonic()
+        results = [ticket.wait(timeout=5) for ticket in tickets]
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(results, [['ok:0'], ['ok:1'], ['ok:2']])
+        self.assertEqual(flush.batches, [[0, 1, 2]])
+
+    def test_flushes_after_max_delay(self):
+        flush = RecordingFlush()
+        writer = self.writer(flush, max_rows=100, max_delay=0.05)
+        ticket = writer.submit(['a', 'b'])
+        self.assertEqual(ticket.wait(timeout=5), ['ok:a', 'ok:b'])
+        self.assertGreaterEqual(time.monotonic() - ticket.submitted, 0.05)
+        self.assertEqual(flush.batches, [['a', 'b']])
+
+    def test_submission_rows_stay_in_one_batch(self):
+        flush = RecordingFlush()
+        writer = self.writer(flush, max_rows=3, max_delay=0.05)
+        first = writer.submit([1, 2])
+        second = writer.submit([3, 4])
+        first.wait(timeout=5)
+        second.wait(timeout=5)
+        self.assertEqual(flush.batches, [[1, 2], [3, 4]])
+
+    def test_retries_each_submission_after_a_lock_error(self):
+        def fail(rows, attempt):
+            if attempt == 1:
+                raise DatabaseLocked('database is locked')
+        flush = RecordingFlush(fail)
+        writer = self.writer(flush, max_rows=2, max_delay=60)
+        first = writer.submit(['x'])
+        second = writer.submit(['y'])
+        self.assertEqual(first.wait(timeout=5), ['ok:x'])
+        self.assertEqual(second.wait(timeout=5), ['ok:y'])
+        self.assertEqual(flush.batches, [['x', 'y'], ['x'], ['y']])
+        stats = writer.stats.snapshot()
+        self.assertEqual(stats['rows'], 2)
+        self.assertEqual(stats['batches'], 2)
+        self.assertEqual(stats['failed_batches'], 1)
+
+    def test_failing_submission_does_not_fail_the_others(self):
+        def fail(rows, attempt):
+            if 'bad' in rows:
+                raise ValueError('bad row')
+        flush = RecordingFlush(fail)
+        writer = self.writer(flush, max_rows=2, max_delay=60)
+        good = writer.submit(['good'])
+        bad = writer.submit(['bad'])
+        self.assertEqual(good.wait(timeout=5), ['ok:good'])
+        with self.assertRaises(ValueError):
+            bad.wait(timeout=5)
+        stats = writer.stats.snapshot()
+        self.assertEqual(stats['rows'], 1)
+        self.assertEqual(stats['failed_batches'], 2)
+
+    def test_concurrent_submissions_are_all_acknowledged(self):
+        flush = RecordingFlush()
+        writer = self.writer(flush, max_rows=50, max_delay=0.01)
+        results = {}
+
+        def submit(number):
+            results[number] = writer.submit([number]).wait(timeout=5)
+        threads = [threading.Thread(target=submit, args=(number,))
+                   for number in range(200)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, dict((number, ['ok:%d' % number])
+                                       for number in range(200)))
+        self.assertEqual(sorted(row for batch in flush.batches
+                                for row in batch), list(range(200)))
+        self.assertTrue(all(len(batch) <= 50 for batch in flush.batches))
+        self.assertEqual(writer.stats.snapshot()['rows'], 200)
+
+    def test_close_flushes_queued_rows(self):
+        flush = RecordingFlush()
+        writer = BatchWriter(flush, max_rows=100, max_delay=60)
+        ticket = writer.submit(['last'])
+        writer.close()
+        self.assertEqual(ticket.wait(timeout=0), ['ok:last'])
+
+
+if __name__ == '__main__':
+    unittest.main()
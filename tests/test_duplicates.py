@@ -0,0 +1,100 @@
+import unittest
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, \
+    create_engine, select
+from sqlalchemy.orm import Session
+
+import duplicates
+
+metadata = MetaData()
+venues = Table('Venue', metadata,
+               Column('id', Integer, primary_key=True),
+               Column('name', String), Column('city', String),
+               Column('state', String), Column('phone', String),
+               Column('fingerprint', String))
+shows = Table('Show', metadata,
+              Column('Venue_id', Integer), Column('Artist_id', Integer),
+              Column('start_time', DateTime))
+
+MAY_1 = datetime(2030, 5, 1, 20, 0)
+MAY_2 = datetime(2030, 5, 2, 20, 0)
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def test_normalize(self):
+        self.assertEqual(duplicates.normalize('  The Musical Hop! '),
+                         'the musical hop')
+        self.assertEqual(duplicates.normalize('Café  Zürich'), 'cafe zurich')
+        self.assertEqual(duplicates.normalize(None), '')
+
+    def test_same_record_written_differently(self):
+        self.assertEqual(
+            duplicates.fingerprint('The Musical Hop', 'San Francisco', 'CA'),
+            duplicates.fingerprint('the musical hop!', 'san  francisco', 'ca'))
+
+    def test_parts_do_not_run_together(self):
+        self.assertNotEqual(duplicates.fingerprint('Hop', 'Austin', 'TX'),
+                            duplicates.fingerprint('Hop Austin', '', 'TX'))
+        self.assertNotEqual(duplicates.fingerprint('Hop', 'Austin', 'TX'),
+                            duplicates.fingerprint('Hop', 'Austin', 'CA'))
+
+
+class MergeTest(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        metadata.create_all(engine)
+        self.session = Session(engine)
+        self.addCleanup(self.session.close)
+        self.session.execute(venues.insert(), [
+            {'id': 1, 'name': 'The Musical Hop', 'city': 'Austin',
+             'state': 'TX', 'phone': None},
+            {'id': 2, 'name': 'Park Square', 'city': 'Austin',
+             'state': 'TX', 'phone': '1'},
+            {'id': 3, 'name': 'the musical hop!', 'city': 'austin',
+             'state': 'TX', 'phone': '555'},
+            {'id': 4, 'name': 'THE MUSICAL HOP', 'city': 'Austin',
+             'state': 'TX', 'phone': '777'},
+        ])
+        self.session.execute(shows.insert(), [
+            {'Venue_id': 1, 'Artist_id': 10, 'start_time': MAY_1},
+            {'Venue_id': 3, 'Artist_id': 10, 'start_time': MAY_1},
+            {'Venue_id': 3, 'Artist_id': 11, 'start_time': MAY_2},
+            {'Venue_id': 4, 'Artist_id': 11, 'start_time': MAY_2},
+            {'Venue_id': 2, 'Artist_id': 10, 'start_time': MAY_2},
+        ])
+        self.session.commit()
+
+    def test_fill_fingerprints_in_batches(self):
+        self.assertEqual(duplicates.fill_fingerprints(
+            self.session, venues, batch_size=3), 4)
+        self.assertEqual(duplicates.fill_fingerprints(self.session, venues), 0)
+        stored = self.session.execute(
+            select([venues.c.fingerprint]).where(venues.c.id == 3)).scalar()
+        self.assertEqual(stored, duplicates.fingerprint(
+            'The Musical Hop', 'Austin', 'TX'))
+
+    def test_duplicate_groups(self):
+        self.assertEqual(duplicates.duplicate_groups(self.session, venues), [])
+        duplicates.fill_fingerprints(self.session, venues)
+        self.assertEqual(duplicates.duplicate_groups(self.session, venues),
+                         [[1, 3, 4]])
+
+    def test_merge_keeps_the_oldest_and_moves_shows_once(self):
+        moved = duplicates.merge_group(self.session, venues, [1, 3, 4],
+                                       [shows], 'Venue_id', ['phone'])
+        self.assertEqual(moved, 1)
+        self.assertEqual([row.id for row in self.session.execute(
+            select([venues.c.id]).order_by(venues.c.id))], [1, 2])
+        self.assertEqual(self.session.execute(
+            select([venues.c.phone]).where(venues.c.id == 1)).scalar(), '555')
+        self.assertEqual(sorted(
+            (row.Venue_id, row.Artist_id, row.start_time)
+            for row in self.session.execute(select([shows]))), [
+            (1, 10, MAY_1), (1, 11, MAY_2), (2, 10, MAY_2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
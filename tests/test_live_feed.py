@@ -0,0 +1,93 @@
+import threading
+import unittest
+
+from live_feed import Hub, HubFull, city_topic, venue_topic, stream, \
+    format_event
+
+
+class TopicTest(unittest.TestCase):
+
+    def test_city_topic_ignores_case_and_spaces(self):
+        self.assertEqual(city_topic(' San Francisco '),
+                         city_topic('san francisco'))
+        self.assertEqual(city_topic(None), ('city', ''))
+
+    def test_venue_topic(self):
+        self.assertEqual(venue_topic('3'), ('venue', 3))
+
+
+class HubTest(unittest.TestCase):
+
+    def test_delivers_to_matching_and_unfiltered_subscribers(self):
+        hub = Hub()
+        everything = hub.subscribe()
+        austin = hub.subscribe([city_topic('Austin')])
+        venue = hub.subscribe([venue_topic(1)])
+        count = hub.publish([city_topic('Austin'), venue_topic(2)], 'show',
+                            {'id': 1})
+        self.assertEqual(count, 2)
+        self.assertEqual(everything.wait(0)[0], [(1, 'show', {'id': 1})])
+        self.assertEqual(austin.wait(0)[0], [(1, 'show', {'id': 1})])
+        self.assertEqual(venue.wait(0), ([], 0))
+
+    def test_each_subscriber_gets_an_event_once(self):
+        hub = Hub()
+        both = hub.subscribe([city_topic('Austin'), venue_topic(1)])
+        self.assertEqual(hub.publish([city_topic('Austin'), venue_topic(1)],
+                                     'show', {}), 1)
+        self.assertEqual(len(both.wait(0)[0]), 1)
+
+    def test_slow_subscriber_drops_the_oldest_events(self):
+        hub = Hub(queue_size=2)
+        subscription = hub.subscribe()
+        for number in range(5):
+            hub.publish([], 'show', number)
+        events, dropped = subscription.wait(0)
+        self.assertEqual([data for _, _, data in events], [3, 4])
+        self.assertEqual(dropped, 3)
+        self.assertEqual(subscription.wait(0), ([], 0))
+
+    def test_subscriber_limit_and_unsubscribe(self):
+        hub = Hub(max_subscribers=1)
+        subscription = hub.subscribe([venue_topic(1)])
+        with self.assertRaises(HubFull):
+            hub.subscribe()
+        hub.unsubscribe(subscription)
+        hub.unsubscribe(subscription)
+        self.assertEqual(hub.snapshot(), {"subscribers": 0, "topics": 0,
+                                          "published": 0})
+        hub.subscribe()
+
+    def test_wait_wakes_up_on_publish(self):
+        hub = Hub()
+        subscription = hub.subscribe()
+        timer = threading.Timer(0.05, hub.publish, ([], 'show', 'late'))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        events, _ = subscription.wait(5)
+        self.assertEqual(events, [(1, 'show', 'late')])
+
+
+class StreamTest(unittest.TestCase):
+
+    def test_format_event(self):
+        self.assertEqual(format_event(7, 'show', {'b': 1, 'a': 2}),
+                         'id: 7\nevent: show\ndata: {"a": 2, "b": 1}\n\n')
+
+    def test_stream_sends_events_heartbeats_and_unsubscribes(self):
+        hub = Hub(queue_size=1)
+        subscription = hub.subscribe()
+        body = stream(hub, subscription, heartbeat=0.01)
+        self.assertEqual(next(body), 'retry: 3000\n\n')
+        self.assertEqual(next(body), ': heartbeat\n\n')
+        hub.publish([], 'show', 1)
+        hub.publish([], 'show', 2)
+        self.assertEqual(next(body), 'event: dropped\ndata: {"count": 1}\n\n')
+        self.assertEqual(next(body), format_event(2, 'show', 2))
+        body.close()
+        self.assertTrue(subscription.closed)
+        self.assertEqual(hub.snapshot()['subscribers'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
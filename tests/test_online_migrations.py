@@ -0,0 +1,178 @@
+import io
+import os
+import sys
+import unittest
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'migrations'))
+import online  # noqa: E402
+
+# a PostgreSQL database the tests may create tables in, e.g.
+# postgresql://postgres@/fyyur_test?host=/tmp
+POSTGRES_URL = os.environ.get('FYYUR_TEST_POSTGRES_URL')
+
+
+@contextmanager
+def migration(connection):
+    context = MigrationContext.configure(connection)
+    with Operations.context(context):
+        with context.begin_transaction():
+            yield
+
+
+@contextmanager
+def offline_postgres():
+    # yields the buffer the generated SQL script is written to
+    output = io.StringIO()
+    context = MigrationContext.configure(
+        dialect_name='postgresql',
+        opts={'as_sql': True, 'output_buffer': output})
+    with Operations.context(context):
+        with context.begin_transaction():
+            yield output
+
+
+class SQLiteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = sa.create_engine('sqlite://',
+                                       poolclass=sa.pool.StaticPool)
+        self.addCleanup(self.engine.dispose)
+        with self.engine.begin() as connection:
+            connection.execute(sa.text(
+                'CREATE TABLE t (id INTEGER PRIMARY KEY, a INTEGER, '
+                'b INTEGER)'))
+            connection.execute(sa.text('INSERT INTO t (id, a) VALUES ' + ','.join(
+                '(%d, %d)' % (key, key) for key in range(1, 101))))
+
+    def scalar(self, statement):
+        with self.engine.connect() as connection:
+            return connection.execute(sa.text(statement)).scalar()
+
+    def index_names(self):
+        return sorted(index['name']
+                      for index in sa.inspect(self.engine).get_indexes('t'))
+
+
+class BackfillTest(SQLiteTestCase):
+
+    def backfill(self, *args, **kwargs):
+        with self.engine.connect() as connection:
+            with migration(connection):
+                return online.backfill(*args, **kwargs)
+
+    def test_updates_every_row_in_batches(self):
+        self.assertEqual(self.backfill('t_b', 't', 'b = a * 2',
+                                       batch_size=30), 100)
+        self.assertEqual(self.scalar('SELECT count(*) FROM t WHERE b = a * 2'),
+                         100)
+        self.assertEqual(self.scalar(
+            "SELECT last_key FROM online_migration_progress "
+            "WHERE name = 't_b'"), 100)
+
+    def test_where_limits_the_rows(self):
+        self.assertEqual(self.backfill('t_even', 't', 'b = 1',
+                                       where='a % 2 = 0'), 50)
+
+    def test_resumes_after_the_recorded_key(self):
+        self.backfill('t_b', 't', 'b = 0')
+        with self.engine.begin() as connection:
+            connection.execute(sa.text(
+                "UPDATE online_migration_progress SET last_key = 60 "
+                "WHERE name = 't_b'"))
+        self.assertEqual(self.backfill('t_b', 't', 'b = a', batch_size=7),
+                         40)
+        self.assertEqual(self.scalar('SELECT count(*) FROM t WHERE b = a'),
+                         40)
+
+    def test_finished_backfill_does_nothing(self):
+        self.backfill('t_b', 't', 'b = a')
+        self.assertEqual(self.backfill('t_b', 't', 'b = a'), 0)
+
+    def test_refuses_offline_mode(self):
+        with self.assertRaises(RuntimeError):
+            with offline_postgres():
+                online.backfill('t_b', 't', 'b = a')
+
+
+class IndexHelpersTest(SQLiteTestCase):
+
+    def test_falls_back_to_plain_index_builds(self):
+        with self.engine.connect() as connection:
+            with migration(connection):
+                with online.lock_timeout():
+                    pass
+                online.create_index_concurrently('ix_t_a_b', 't', ['a', 'b'])
+        self.assertEqual(self.index_names(), ['ix_t_a_b'])
+        with self.engine.connect() as connection:
+            with migration(connection):
+                online.drop_index_concurrently('ix_t_a_b', 't')
+        self.assertEqual(self.index_names(), [])
+
+    def test_offline_postgres_script(self):
+        with offline_postgres() as output:
+            with online.lock_timeout('3s'):
+                pass
+            online.create_index_concurrently(
+                'ix_t_a', 't', [sa.text("coalesce(a, 0)")])
+            online.drop_index_concurrently('ix_t_b', 't')
+        script = output.getvalue()
+        self.assertIn("SET LOCAL lock_timeout = '3s'", script)
+        self.assertIn('CREATE INDEX CONCURRENTLY ix_t_a ON t '
+                      '(coalesce(a, 0))', script)
+        self.assertIn('DROP INDEX CONCURRENTLY IF EXISTS "ix_t_b"', script)
+
+
+@unittest.skipUnless(POSTGRES_URL, 'set FYYUR_TEST_POSTGRES_URL')
+class PostgresIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = sa.create_engine(POSTGRES_URL)
+        self.addCleanup(self.engine.dispose)
+        with self.engine.begin() as connection:
+            connection.execute(sa.text('DROP TABLE IF EXISTS online_test'))
+            connection.execute(sa.text(
+                'CREATE TABLE online_test (id INTEGER PRIMARY KEY, '
+                'a INTEGER)'))
+            connection.execute(sa.text(
+                'INSERT INTO online_test VALUES (1, 1), (2, 1)'))
+        self.addCleanup(self.drop_table)
+
+    def drop_table(self):
+        with self.engine.begin() as connection:
+            connection.execute(sa.text('DROP TABLE online_test'))
+
+    def index_valid(self):
+        with self.engine.connect() as connection:
+            return connection.execute(sa.text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c "
+                "ON c.oid = i.indexrelid WHERE c.relname = 'ix_online_a'"
+            )).scalar()
+
+    def create_index(self):
+        with self.engine.connect() as connection:
+            with migration(connection):
+                online.create_index_concurrently(
+                    'ix_online_a', 'online_test', ['a'], unique=True)
+
+    def test_rebuilds_an_index_left_invalid_by_a_failed_build(self):
+        with self.assertRaises(sa.exc.IntegrityError):
+            self.create_index()
+        self.assertIs(self.index_valid(), False)
+        with self.engine.begin() as connection:
+            connection.execute(sa.text('UPDATE online_test SET a = id'))
+        self.create_index()
+        self.assertIs(self.index_valid(), True)
+        # a second run finds the valid index and leaves it alone
+        self.create_index()
+        self.assertIs(self.index_valid(), True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+
+from sqlalchemy import Column, Integer, String, create_engine, Index, text
+from sqlalchemy.orm import Session, declarative_base
+
+from pagination import encode_cursor, decode_cursor, keyset_page, sort_key
+
+Base = declarative_base()
+
+
+class Artist(Base):
+    __tablename__ = 'Artist'
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    city = Column(String)
+    __table_args__ = (Index('ix_Artist_city_id', sort_key(city), id),)
+
+
+class CursorTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for value in ('The Musical Hop', 3.5, 7, ''):
+            self.assertEqual(decode_cursor(encode_cursor(value, 42)),
+                             (value, 42))
+
+    def test_missing_cursor(self):
+        self.assertIsNone(decode_cursor(None))
+        self.assertIsNone(decode_cursor(''))
+
+    def test_mangled_cursors_raise_value_error(self):
+        for cursor in ('%%%', 'bm90IGpzb24', encode_cursor([1, 2], 1),
+                       encode_cursor(True, 1), encode_cursor(None, 1),
+                       encode_cursor('a', 'b')):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+
+class KeysetPageTest(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = Session(engine)
+        self.addCleanup(self.session.close)
+        self.session.add_all([
+            Artist(id=1, name='Alpha', city='Austin'),
+            Artist(id=2, name='Bravo', city=None),
+            Artist(id=3, name='Charlie', city='Boston'),
+            Artist(id=4, name='Delta', city='Austin'),
+            Artist(id=5, name='Echo', city=None),
+        ])
+        self.session.commit()
+
+    def query(self):
+        return self.session.query(Artist.id, Artist.name, Artist.city)
+
+    def walk(self, sort_column, per_page):
+        ids = []
+        page = keyset_page(self.query(), sort_column, Artist.id, per_page)
+        while True:
+            ids.append([row.id for row in page.items])
+            if page.next_cursor is None:
+                return ids, page
+            page = keyset_page(self.query(), sort_column, Artist.id,
+                               per_page, after=page.next_cursor)
+
+    def test_walks_every_row_once(self):
+        ids, last = self.walk(Artist.name, 2)
+        self.assertEqual(ids, [[1, 2], [3, 4], [5]])
+        self.assertIsNotNone(last.prev_cursor)
+
+    def test_null_sort_values_come_first(self):
+        ids, _ = self.walk(Artist.city, 2)
+        self.assertEqual(ids, [[2, 5], [1, 4], [3]])
+
+    def test_previous_page(self):
+        first = keyset_page(self.query(), Artist.city, Artist.id, 2)
+        second = keyset_page(self.query(), Artist.city, Artist.id, 2,
+                             after=first.next_cursor)
+        back = keyset_page(self.query(), Artist.city, Artist.id, 2,
+                           before=second.prev_cursor)
+        self.assertEqual([row.id for row in back.items], [2, 5])
+        self.assertIsNone(back.prev_cursor)
+        self.assertEqual(back.next_cursor, first.next_cursor)
+
+    def test_first_page_has_no_previous(self):
+        page = keyset_page(self.query(), Artist.name, Artist.id, 10)
+        self.assertEqual(len(page.items), 5)
+        self.assertIsNone(page.prev_cursor)
+        self.assertIsNone(page.next_cursor)
+
+    def test_mangled_cursor_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            keyset_page(self.query(), Artist.name, Artist.id, 2,
+                        after='not a cursor')
+
+    def test_sort_key_uses_the_index(self):
+        page = self.query().filter(sort_key(Artist.city) > '').\
+            order_by(sort_key(Artist.city), Artist.id)
+        plan = self.session.execute(text(
+            'EXPLAIN QUERY PLAN ' + str(page.statement.compile(
+                compile_kwargs={'literal_binds': True})))).fetchall()
+        self.assertIn('ix_Artist_city_id', ' '.join(row[-1] for row in plan))
+
+
+if __name__ == '__main__':
+    unittest.main()
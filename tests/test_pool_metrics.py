@@ -0,0 +1,57 @@
+import time
+import unittest
+
+from sqlalchemy import create_engine, exc
+
+import pool_metrics
+
+
+class PoolMetricsTest(unittest.TestCase):
+
+    def engine(self, **options):
+        engine = create_engine(
+            'sqlite://', poolclass=pool_metrics.TimedQueuePool,
+            connect_args={'check_same_thread': False}, **options)
+        self.addCleanup(engine.dispose)
+        return engine, pool_metrics.instrument(engine)
+
+    def test_counts_checkouts_and_connection_age(self):
+        engine, stats = self.engine(pool_size=2)
+        with engine.connect() as connection:
+            connection.exec_driver_sql('SELECT 1')
+            time.sleep(0.05)
+            held = stats.snapshot(engine.pool)
+            self.assertEqual(held['in_use'], 1)
+            self.assertGreaterEqual(held['checkout_held_max_s'], 0.05)
+        time.sleep(0.05)
+        idle = stats.snapshot(engine.pool)
+        self.assertEqual(idle['checkouts'], 1)
+        self.assertEqual(idle['checkins'], 1)
+        self.assertEqual(idle['connects'], 1)
+        self.assertEqual(idle['open_connections'], 1)
+        self.assertEqual(idle['checkout_held_max_s'], 0.0)
+        # the connection is idle now but was opened over 0.1s ago
+        self.assertGreaterEqual(idle['connection_age_max_s'], 0.1)
+
+    def test_closed_connections_are_not_aged(self):
+        engine, stats = self.engine(pool_size=1)
+        with engine.connect():
+            pass
+        engine.pool.dispose()
+        snapshot = stats.snapshot(engine.pool)
+        self.assertEqual(snapshot['open_connections'], 0)
+        self.assertEqual(snapshot['connection_age_max_s'], 0.0)
+
+    def test_records_checkout_timeouts(self):
+        engine, stats = self.engine(pool_size=1, max_overflow=0,
+                                    pool_timeout=0.05)
+        with engine.connect():
+            with self.assertRaises(exc.TimeoutError):
+                engine.connect()
+        snapshot = stats.snapshot(engine.pool)
+        self.assertEqual(snapshot['checkout_timeouts'], 1)
+        self.assertGreaterEqual(snapshot['wait_max_ms'], 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import threading
+import unittest
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+import query_plans
+
+
+class QueryPlansTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine(
+            'sqlite://', poolclass=StaticPool,
+            connect_args={'check_same_thread': False})
+        self.addCleanup(self.engine.dispose)
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                'CREATE TABLE Artist (id INTEGER PRIMARY KEY, name TEXT, '
+                'city TEXT)'))
+            connection.execute(text(
+                'CREATE INDEX ix_Artist_name_id ON Artist (name, id)'))
+
+    def run_select(self, statement):
+        with self.engine.connect() as connection:
+            connection.execute(text(statement)).fetchall()
+
+    def test_captures_only_the_calling_thread(self):
+        with query_plans.capture_selects(self.engine) as captured:
+            self.run_select('SELECT id FROM Artist WHERE id = 1')
+            other = threading.Thread(
+                target=self.run_select, args=('SELECT name FROM Artist',))
+            other.start()
+            other.join()
+        self.assertEqual([statement for statement, _ in captured],
+                         ['SELECT id FROM Artist WHERE id = 1'])
+
+    def test_stops_capturing_after_the_block(self):
+        with query_plans.capture_selects(self.engine) as captured:
+            pass
+        self.run_select('SELECT id FROM Artist')
+        self.assertEqual(captured, [])
+
+    def plans(self, *statements):
+        return query_plans.explain(
+            self.engine, [(statement, ()) for statement in statements])
+
+    def test_index_scan_is_a_full_scan(self):
+        plans = self.plans(
+            'SELECT id, name FROM Artist ORDER BY name, id LIMIT 20',
+            'SELECT id FROM Artist WHERE id = 1',
+            'SELECT id FROM Artist WHERE city = \'Austin\'')
+        scans = [plan['full_scans'] for plan in plans.values()]
+        self.assertEqual(scans, [['Artist'], [], ['Artist']])
+
+    def test_compare_reports_new_full_scans(self):
+        statement = 'SELECT id FROM Artist WHERE city = ?'
+        golden = {'GET /artists': {statement: {
+            'shape': 'SEARCH Artist USING INDEX ix_Artist_city (city=?)',
+            'cost': None, 'full_scans': []}}}
+        current = {'GET /artists': {statement: {
+            'shape': 'SCAN Artist', 'cost': None,
+            'full_scans': ['Artist']}}}
+        problems = query_plans.compare(golden, current, 0.5)
+        self.assertEqual(len(problems), 1)
+        self.assertIn('full scan of Artist', problems[0])
+        self.assertEqual(query_plans.compare(golden, golden, 0.5), [])
+
+    def test_compare_reports_cost_growth_and_unknown_routes(self):
+        plan = {'shape': 'Index Scan', 'cost': 10.0, 'full_scans': []}
+        grown = dict(plan, cost=16.0)
+        problems = query_plans.compare({'GET /': {'SELECT 1': plan}},
+                                       {'GET /': {'SELECT 1': grown},
+                                        'GET /new': {'SELECT 1': plan}}, 0.5)
+        self.assertEqual(problems, [
+            'GET /: cost 10.0 -> 16.0 in SELECT 1',
+            'GET /new: no golden plans, run with --update'])
+
+
+if __name__ == '__main__':
+    unittest.main()
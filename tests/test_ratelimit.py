@@ -0,0 +1,169 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from flask import Flask
+
+from ratelimit import MemoryBuckets, SQLiteBuckets, RateLimiter, refill, \
+    take_tokens, client_address, max_idle
+
+
+class TokenMathTest(unittest.TestCase):
+
+    def test_refill_is_capped_at_capacity(self):
+        self.assertEqual(refill(0, 10.0, 2, 10, 12.0), 4)
+        self.assertEqual(refill(5, 10.0, 2, 10, 100.0), 10)
+
+    def test_take_tokens_takes_from_every_bucket(self):
+        self.assertEqual(take_tokens([(3, 1), (1.5, 10)]),
+                         (True, [2, 0.5], 0.0))
+
+    def test_take_tokens_takes_nothing_when_one_bucket_is_empty(self):
+        allowed, left, retry_after = take_tokens([(3, 1), (0.5, 2)])
+        self.assertFalse(allowed)
+        self.assertEqual(left, [3, 0.5])
+        self.assertEqual(retry_after, 0.25)
+
+    def test_max_idle(self):
+        self.assertEqual(max_idle({'a': {'per_client': (1, 10)},
+                                   'b': {'global': (2, 100)}}), 50)
+        self.assertEqual(max_idle({}), 0)
+
+
+class BucketsTests(object):
+    # run against both storages by the subclasses below
+
+    def test_capacity_then_refill(self):
+        scopes = [('search:1.2.3.4', (1, 2))]
+        self.assertEqual(self.buckets.take(scopes, now=100.0), (True, 0.0))
+        self.assertEqual(self.buckets.take(scopes, now=100.0), (True, 0.0))
+        self.assertEqual(self.buckets.take(scopes, now=100.0), (False, 1.0))
+        self.assertEqual(self.buckets.take(scopes, now=101.0), (True, 0.0))
+
+    def test_refused_request_does_not_drain_other_buckets(self):
+        client = ('search:a', (1, 1))
+        shared = ('search:*', (1, 2))
+        self.assertTrue(self.buckets.take([client, shared], now=0.0)[0])
+        self.assertFalse(self.buckets.take([client, shared], now=0.0)[0])
+        other = ('search:b', (1, 1))
+        self.assertTrue(self.buckets.take([other, shared], now=0.0)[0])
+
+    def test_keys_are_independent(self):
+        self.assertTrue(self.buckets.take([('a', (1, 1))], now=0.0)[0])
+        self.assertTrue(self.buckets.take([('b', (1, 1))], now=0.0)[0])
+        self.assertFalse(self.buckets.take([('a', (1, 1))], now=0.0)[0])
+
+
+class MemoryBucketsTest(BucketsTests, unittest.TestCase):
+
+    def setUp(self):
+        self.buckets = MemoryBuckets()
+
+    def test_full_buckets_are_pruned(self):
+        buckets = MemoryBuckets(max_keys=2)
+        buckets.take([('a', (1, 1))], now=0.0)
+        buckets.take([('b', (1, 1))], now=0.0)
+        buckets.take([('c', (1, 1))], now=5.0)
+        self.assertEqual(sorted(buckets._buckets), ['c'])
+
+
+class SQLiteBucketsTest(BucketsTests, unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'buckets.db')
+        self.buckets = SQLiteBuckets(self.path, max_idle=10, prune_every=0)
+
+    def test_shared_between_instances(self):
+        other = SQLiteBuckets(self.path)
+        self.assertTrue(self.buckets.take([('a', (1, 1))], now=0.0)[0])
+        self.assertFalse(other.take([('a', (1, 1))], now=0.0)[0])
+
+    def test_idle_rows_are_pruned(self):
+        now = time.time()
+        self.buckets.take([('old', (1, 1))], now=now)
+        self.buckets.take([('new', (1, 1))], now=now + 20)
+        keys = [row[0] for row in self.buckets._connection().execute(
+            'SELECT key FROM buckets')]
+        self.assertEqual(keys, ['new'])
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def app(self, **config):
+        app = Flask(__name__)
+        app.config['RATE_LIMITS'] = {
+            'venue_search': {'per_client': (0.001, 1), 'global': (0.001, 3)},
+            'artist_search': {'per_client': (0.001, 1)},
+        }
+        app.config.update(config)
+        limiter = RateLimiter(app)
+
+        @app.route('/venues')
+        @limiter.limit('venue_search')
+        def venues():
+            return 'venues'
+
+        @app.route('/artists')
+        @limiter.limit('artist_search')
+        def artists():
+            return 'artists'
+        return app.test_client()
+
+    def test_over_limit_gets_429_with_retry_after(self):
+        client = self.app()
+        self.assertEqual(client.get('/venues').status_code, 200)
+        response = client.get('/venues')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1000')
+
+    def test_routes_have_their_own_buckets(self):
+        client = self.app()
+        self.assertEqual(client.get('/venues').status_code, 200)
+        self.assertEqual(client.get('/artists').status_code, 200)
+        self.assertEqual(client.get('/venues').status_code, 429)
+        self.assertEqual(client.get('/artists').status_code, 429)
+
+    def test_clients_have_their_own_buckets(self):
+        client = self.app()
+        for address in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+            response = client.get('/venues',
+                                   environ_base={'REMOTE_ADDR': address})
+            self.assertEqual(response.status_code, 200)
+        # the global bucket of 3 is empty now
+        response = client.get('/venues', environ_base={'REMOTE_ADDR': '::1'})
+        self.assertEqual(response.status_code, 429)
+
+    def test_unknown_limit_name_is_not_limited(self):
+        app = Flask(__name__)
+        limiter = RateLimiter(app)
+        with app.test_request_context('/'):
+            self.assertIsNone(limiter.check('nothing'))
+
+
+class ClientAddressTest(unittest.TestCase):
+
+    def address(self, trusted_proxies, forwarded=None):
+        headers = {'X-Forwarded-For': forwarded} if forwarded else {}
+        with Flask(__name__).test_request_context(
+                '/', headers=headers,
+                environ_base={'REMOTE_ADDR': '10.0.0.9'}):
+            return client_address(trusted_proxies)
+
+    def test_direct_clients_use_the_socket_address(self):
+        self.assertEqual(self.address(0, '1.1.1.1'), '10.0.0.9')
+
+    def test_behind_proxies_uses_the_trusted_entry(self):
+        self.assertEqual(self.address(1, 'spoofed, 2.2.2.2'), '2.2.2.2')
+        self.assertEqual(self.address(2, 'spoofed, 2.2.2.2, 10.0.0.5'),
+                         '2.2.2.2')
+
+    def test_short_header_falls_back_to_the_socket_address(self):
+        self.assertEqual(self.address(2, '2.2.2.2'), '10.0.0.9')
+
+
+if __name__ == '__main__':
+    unittest.main()
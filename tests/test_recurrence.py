@@ -0,0 +1,54 @@
+import unittest
+from datetime import datetime
+
+from recurrence import expand_occurrences, RecurrenceError
+
+
+START = datetime(2030, 1, 1, 20, 0)
+
+
+class ExpandOccurrencesTest(unittest.TestCase):
+
+    def test_single_show_without_repeat(self):
+        self.assertEqual(expand_occurrences(START), [START])
+
+    def test_every_n_days_until_includes_the_end_date(self):
+        occurrences = expand_occurrences(
+            START, every_days=7, until=datetime(2030, 1, 15, 20, 0))
+        self.assertEqual([o.day for o in occurrences], [1, 8, 15])
+
+    def test_rule(self):
+        occurrences = expand_occurrences(START, rule='FREQ=WEEKLY;COUNT=3')
+        self.assertEqual([o.day for o in occurrences], [1, 8, 15])
+
+    def test_interval_without_end_date_is_rejected(self):
+        with self.assertRaises(RecurrenceError):
+            expand_occurrences(START, every_days=7)
+
+    def test_end_date_without_interval_is_rejected(self):
+        with self.assertRaises(RecurrenceError):
+            expand_occurrences(START, until=datetime(2030, 2, 1))
+
+    def test_interval_below_one_day_is_rejected(self):
+        with self.assertRaises(RecurrenceError):
+            expand_occurrences(START, every_days=0,
+                               until=datetime(2030, 2, 1))
+
+    def test_expansion_past_the_limit_is_rejected(self):
+        with self.assertRaises(RecurrenceError) as raised:
+            expand_occurrences(START, every_days=1,
+                               until=datetime(2031, 1, 1), limit=10)
+        self.assertEqual(str(raised.exception),
+                         'booking expands to more than 10 shows')
+        with self.assertRaises(RecurrenceError):
+            expand_occurrences(START, rule='FREQ=DAILY', limit=10)
+
+    def test_unparsable_rule_has_a_fixed_message(self):
+        with self.assertRaises(RecurrenceError) as raised:
+            expand_occurrences(START, rule='FREQ=SOMETIMES')
+        self.assertEqual(str(raised.exception),
+                         'repeat rule could not be parsed')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import time
+import unittest
+from collections import namedtuple
+
+from search_cache import SearchCache, normalize_term, entry_size
+
+Item = namedtuple('Item', 'id name')
+
+HOP = (Item(1, 'The Musical Hop'),)
+
+
+class SearchCacheTest(unittest.TestCase):
+
+    def test_normalize_term(self):
+        self.assertEqual(normalize_term('  The HOP '), 'the hop')
+        self.assertEqual(normalize_term(None), '')
+
+    def test_hit_and_miss(self):
+        cache = SearchCache()
+        self.assertIsNone(cache.get('venue', 'hop'))
+        cache.put('venue', 'hop', HOP)
+        self.assertEqual(cache.get('venue', 'hop'), HOP)
+        self.assertIsNone(cache.get('artist', 'hop'))
+        snapshot = cache.snapshot()
+        self.assertEqual((snapshot['hits'], snapshot['misses']), (1, 2))
+
+    def test_empty_results_are_cached(self):
+        cache = SearchCache()
+        cache.put('venue', 'nothing', ())
+        self.assertEqual(cache.get('venue', 'nothing'), ())
+
+    def test_entries_expire(self):
+        cache = SearchCache(ttl=0.01)
+        cache.put('venue', 'hop', HOP)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('venue', 'hop'))
+        self.assertEqual(cache.snapshot()['entries'], 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        size = entry_size('aa', HOP)
+        cache = SearchCache(max_bytes=size * 2)
+        cache.put('venue', 'aa', HOP)
+        cache.put('venue', 'bb', HOP)
+        cache.get('venue', 'aa')
+        cache.put('venue', 'cc', HOP)
+        self.assertEqual(cache.get('venue', 'aa'), HOP)
+        self.assertIsNone(cache.get('venue', 'bb'))
+        snapshot = cache.snapshot()
+        self.assertEqual(snapshot['evictions'], 1)
+        self.assertLessEqual(snapshot['bytes'], snapshot['max_bytes'])
+
+    def test_entry_larger_than_the_budget_is_not_cached(self):
+        cache = SearchCache(max_bytes=10)
+        cache.put('venue', 'hop', HOP)
+        self.assertEqual(cache.snapshot()['entries'], 0)
+
+    def test_replacing_an_entry_keeps_the_byte_count(self):
+        cache = SearchCache()
+        cache.put('venue', 'hop', HOP)
+        cache.put('venue', 'hop', HOP)
+        self.assertEqual(cache.snapshot()['bytes'], entry_size('hop', HOP))
+
+    def test_invalidate_drops_terms_contained_in_the_name(self):
+        cache = SearchCache()
+        for term in ('hop', 'musical', 'the m', 'jazz', ''):
+            cache.put('venue', term, ())
+        cache.put('artist', 'hop', ())
+        cache.invalidate('venue', 'The Musical HOP')
+        self.assertIsNone(cache.get('venue', 'hop'))
+        self.assertIsNone(cache.get('venue', 'musical'))
+        self.assertIsNone(cache.get('venue', 'the m'))
+        self.assertIsNone(cache.get('venue', ''))
+        self.assertEqual(cache.get('venue', 'jazz'), ())
+        self.assertEqual(cache.get('artist', 'hop'), ())
+        self.assertEqual(cache.snapshot()['invalidations'], 4)
+
+    def test_rename_invalidates_old_and_new_name(self):
+        cache = SearchCache()
+        cache.put('artist', 'guns', ())
+        cache.put('artist', 'petals', ())
+        cache.invalidate('artist', 'Petals', 'Guns', None)
+        self.assertEqual(cache.snapshot()['entries'], 0)
+
+    def test_clear(self):
+        cache = SearchCache()
+        cache.put('venue', 'hop', HOP)
+        cache.clear()
+        self.assertEqual(cache.snapshot()['entries'], 0)
+        self.assertEqual(cache.snapshot()['bytes'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
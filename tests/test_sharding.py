@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from flask import Flask, current_app
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from sharding import ShardRouter, parse_shard_config
+
+
+class ParseShardConfigTest(unittest.TestCase):
+
+    def test_parses_binds_and_states(self):
+        binds, states = parse_shard_config(
+            'west=sqlite:////tmp/west.db, east=postgresql://u:p@db/east?x=1',
+            'west=CA, OR,WA;east=NY,NJ')
+        self.assertEqual(binds, {'west': 'sqlite:////tmp/west.db',
+                                 'east': 'postgresql://u:p@db/east?x=1'})
+        self.assertEqual(states, {'west': ['CA', 'OR', 'WA'],
+                                  'east': ['NY', 'NJ']})
+
+    def test_unset(self):
+        self.assertEqual(parse_shard_config(None, ''), ({}, {}))
+
+
+class ShardRouterTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.app = Flask(__name__)
+        self.app.config.update(
+            SHARD_BINDS=dict(
+                (group, 'sqlite:///' + os.path.join(directory, group + '.db'))
+                for group in ('east', 'west')),
+            SHARD_STATES={'west': ['CA', 'WA'], 'east': ['NY']},
+            SQLALCHEMY_ENGINE_OPTIONS={'poolclass': QueuePool,
+                                       'pool_size': 3})
+        self.shards = ShardRouter(self.app)
+        for group, engine in self.shards.engines.items():
+            self.addCleanup(engine.dispose)
+            with engine.begin() as connection:
+                connection.execute(text('CREATE TABLE t (n INTEGER)'))
+                connection.execute(text('INSERT INTO t VALUES ' + ','.join(
+                    '(%d)' % n for n in (range(0, 10, 2) if group == 'east'
+                                         else range(1, 10, 3)))))
+
+    def test_disabled_without_binds(self):
+        shards = ShardRouter(Flask(__name__))
+        self.assertFalse(shards.enabled)
+        self.assertIsNone(shards.group_for_state('CA'))
+
+    def test_groups_and_states(self):
+        self.assertTrue(self.shards.enabled)
+        self.assertEqual(self.shards.groups, ['east', 'west'])
+        self.assertEqual(self.shards.group_for_state('CA'), 'west')
+        self.assertEqual(self.shards.group_for_state('NY'), 'east')
+        # unlisted states go to the first group unless SHARD_DEFAULT is set
+        self.assertEqual(self.shards.group_for_state('TX'), 'east')
+
+    def test_engines_share_the_primary_pool_settings(self):
+        engine = self.shards.engines['west']
+        self.assertEqual(engine.pool.size(), 3)
+        with engine.connect() as connection:
+            other = threading.Thread(target=lambda: engine.connect().close())
+            other.start()
+            other.join()
+            connection.execute(text('SELECT 1'))
+
+    def test_use_nests_and_is_per_thread(self):
+        seen = []
+        self.assertIsNone(self.shards.current)
+        with self.shards.use('west'):
+            with self.shards.use('east'):
+                self.assertEqual(self.shards.current, 'east')
+            self.assertEqual(self.shards.current, 'west')
+            thread = threading.Thread(
+                target=lambda: seen.append(self.shards.current))
+            thread.start()
+            thread.join()
+        self.assertIsNone(self.shards.current)
+        self.assertEqual(seen, [None])
+
+    def read(self):
+        with self.shards.engine().connect() as connection:
+            return [row[0] for row in connection.execute(
+                text('SELECT n FROM t ORDER BY n'))]
+
+    def test_scatter_runs_once_per_shard_in_shard_order(self):
+        def function():
+            return current_app.name, self.shards.current, self.read()
+        self.assertEqual(self.shards.scatter(self.app, function), [
+            (self.app.name, 'east', [0, 2, 4, 6, 8]),
+            (self.app.name, 'west', [1, 4, 7])])
+
+    def test_cleanup_runs_on_every_shard_even_after_an_error(self):
+        cleaned = []
+
+        def function():
+            if self.shards.current == 'west':
+                raise RuntimeError('west is down')
+            return []
+        with self.assertRaises(RuntimeError):
+            self.shards.scatter(
+                self.app, function,
+                cleanup=lambda: cleaned.append(self.shards.current))
+        self.assertEqual(sorted(cleaned), ['east', 'west'])
+
+    def test_gather_concatenates_or_merges(self):
+        self.assertEqual(self.shards.gather(self.app, self.read),
+                         [0, 2, 4, 6, 8, 1, 4, 7])
+        self.assertEqual(self.shards.gather(self.app, self.read,
+                                            key=lambda n: n),
+                         [0, 1, 2, 4, 4, 6, 7, 8])
+
+        def read_descending():
+            return list(reversed(self.read()))
+        self.assertEqual(self.shards.gather(self.app, read_descending,
+                                            key=lambda n: n, reverse=True),
+                         [8, 7, 6, 4, 4, 2, 1, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import threading
+import unittest
+
+from trending import RecentItems, TopCounter, HomePanels
+
+
+class RecentItemsTest(unittest.TestCase):
+
+    def test_newest_first_and_bounded(self):
+        recent = RecentItems(3)
+        for number in range(1, 5):
+            recent.add(number, 'item %d' % number)
+        self.assertEqual([item_id for item_id, _ in recent.items()],
+                         [4, 3, 2])
+
+    def test_adding_again_moves_to_the_front(self):
+        recent = RecentItems(3)
+        recent.add(1, 'one')
+        recent.add(2, 'two')
+        recent.add(1, 'uno')
+        self.assertEqual(recent.items(), [(1, 'uno'), (2, 'two')])
+
+    def test_rename_keeps_the_position(self):
+        recent = RecentItems(3)
+        recent.add(1, 'one')
+        recent.add(2, 'two')
+        recent.rename(1, 'uno')
+        recent.rename(9, 'missing')
+        self.assertEqual(recent.items(), [(2, 'two'), (1, 'uno')])
+
+    def test_replace(self):
+        recent = RecentItems(2)
+        recent.add(1, 'one')
+        recent.replace([(5, 'five'), (4, 'four'), (3, 'three')])
+        self.assertEqual(recent.items(), [(5, 'five'), (4, 'four')])
+
+
+class TopCounterTest(unittest.TestCase):
+
+    def test_top_is_largest_first(self):
+        counter = TopCounter(2)
+        for key, count in ((1, 3), (2, 5), (3, 1)):
+            counter.add(key, 'venue %d' % key, count)
+        self.assertEqual(counter.top(), [(2, 'venue 2', 5),
+                                         (1, 'venue 1', 3)])
+
+    def test_untracked_key_takes_over_the_smallest_counter(self):
+        counter = TopCounter(1, capacity=2)
+        counter.add('a', 'A', 5)
+        counter.add('b', 'B', 2)
+        counter.add('c', 'C')
+        # c inherits b's count of 2, overestimating by at most that
+        self.assertEqual(counter.top(), [('a', 'A', 5)])
+        counter.add('c', 'C', 3)
+        self.assertEqual(counter.top(), [('c', 'C', 6)])
+
+    def test_replace_loads_exact_counts(self):
+        counter = TopCounter(2)
+        counter.add(1, 'one', 100)
+        counter.replace([(2, 'two', 4), (3, 'three', 7)])
+        self.assertEqual(counter.top(), [(3, 'three', 7), (2, 'two', 4)])
+        counter.rename(2, 'deux')
+        self.assertEqual(counter.top()[1], (2, 'deux', 4))
+
+
+class HomePanelsTest(unittest.TestCase):
+
+    def test_rebuild_replaces_the_panels(self):
+        panels = HomePanels(lambda: ([(2, 'v2')], [(7, 'a7')],
+                                     [(2, 'v2', 3)]), size=2)
+        panels.listed('venue', 1, 'v1')
+        panels.rebuild()
+        self.assertEqual(panels.recent['venue'].items(), [(2, 'v2')])
+        self.assertEqual(panels.recent['artist'].items(), [(7, 'a7')])
+        self.assertEqual(panels.busiest_venues.top(), [(2, 'v2', 3)])
+        self.assertIsNotNone(panels.rebuilt_at)
+
+    def test_changes_during_a_rebuild_are_kept(self):
+        def read():
+            panels.listed('venue', 3, 'new venue')
+            panels.show_booked(3, 'new venue')
+            panels.renamed('venue', 2, 'renamed')
+            return [(2, 'v2')], [], [(2, 'v2', 4)]
+        panels = HomePanels(read, size=3)
+        panels.rebuild()
+        self.assertEqual(panels.recent['venue'].items(),
+                         [(3, 'new venue'), (2, 'renamed')])
+        self.assertEqual(panels.busiest_venues.top(),
+                         [(2, 'renamed', 4), (3, 'new venue', 1)])
+        panels.listed('venue', 4, 'later')
+        self.assertEqual(panels._changes_during_rebuild, None)
+
+    def test_failed_rebuild_keeps_the_panels(self):
+        def read():
+            raise RuntimeError('database down')
+        panels = HomePanels(read)
+        panels.listed('artist', 1, 'a1')
+        with self.assertRaises(RuntimeError):
+            panels.rebuild()
+        self.assertEqual(panels.recent['artist'].items(), [(1, 'a1')])
+        self.assertIsNone(panels._changes_during_rebuild)
+
+    def test_started_panels_do_not_wait_on_snapshot(self):
+        release = threading.Event()
+
+        def read():
+            release.wait(5)
+            return [(1, 'v1')], [], []
+        panels = HomePanels(read, first_wait=5)
+        panels.start()
+        panels.start()
+        self.assertEqual(panels.snapshot()['recent_venues'], [])
+        release.set()
+        self.assertTrue(panels._first_done.wait(5))
+        self.assertEqual(panels.snapshot()['recent_venues'], [(1, 'v1')])
+
+    def test_first_snapshot_starts_and_waits_for_the_first_rebuild(self):
+        panels = HomePanels(lambda: ([(1, 'v1')], [], []), first_wait=5)
+        self.assertEqual(panels.snapshot()['recent_venues'], [(1, 'v1')])
+
+
+if __name__ == '__main__':
+    unittest.main()
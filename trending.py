@@ -0,0 +1,193 @@
+# bounded in-memory structures behind the homepage panels. they are fed
+# by the create/edit/show routes as things happen and rebuilt from the
+# database every few minutes, so reading them never touches the database
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class RecentItems(object):
+    # the <size> most recently listed (id, name) pairs, newest first
+
+    def __init__(self, size):
+        self._items = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, item_id, name):
+        with self._lock:
+            self._remove(item_id)
+            self._items.appendleft((item_id, name))
+
+    def rename(self, item_id, name):
+        with self._lock:
+            for position, (existing_id, _) in enumerate(self._items):
+                if existing_id == item_id:
+                    self._items[position] = (item_id, name)
+                    return
+
+    def replace(self, items):
+        # newest first, as from ORDER BY id DESC
+        with self._lock:
+            self._items.clear()
+            self._items.extend(items[:self._items.maxlen])
+
+    def items(self):
+        with self._lock:
+            return list(self._items)
+
+    def _remove(self, item_id):
+        for position, (existing_id, _) in enumerate(self._items):
+            if existing_id == item_id:
+                del self._items[position]
+                return
+
+
+class TopCounter(object):
+    # approximate top-N counts in bounded memory (the Space-Saving
+    # algorithm): at most <capacity> keys are tracked and an untracked key
+    # takes over the smallest counter. counts can be overestimated by at
+    # most the count of the counter taken over, until the next replace()
+    # loads exact counts again
+
+    def __init__(self, size, capacity=None):
+        self.size = size
+        self.capacity = max(capacity or size * 10, size)
+        self._counts = {}
+        self._names = {}
+        self._top = []
+        self._lock = threading.Lock()
+
+    def add(self, key, name, count=1):
+        with self._lock:
+            if key not in self._counts and \
+                    len(self._counts) >= self.capacity:
+                smallest = min(self._counts, key=self._counts.get)
+                floor = self._counts.pop(smallest)
+                del self._names[smallest]
+                self._counts[key] = floor
+            self._counts[key] = self._counts.get(key, 0) + count
+            self._names[key] = name
+            self._refresh()
+
+    def rename(self, key, name):
+        with self._lock:
+            if key in self._names:
+                self._names[key] = name
+                self._refresh()
+
+    def replace(self, counts):
+        # [(key, name, count)], the exact counts of the largest keys
+        with self._lock:
+            counts = sorted(counts, key=lambda item: -item[2])
+            counts = counts[:self.capacity]
+            self._counts = dict((key, count) for key, _, count in counts)
+            self._names = dict((key, name) for key, name, _ in counts)
+            self._refresh()
+
+    def top(self):
+        # [(key, name, count)], largest first. computed on write so that
+        # reading is a list copy
+        return list(self._top)
+
+    def _refresh(self):
+        ranked = sorted(self._counts.items(),
+                        key=lambda item: (-item[1], item[0]))[:self.size]
+        self._top = [(key, self._names[key], count) for key, count in ranked]
+
+
+class HomePanels(object):
+    # recently listed venues and artists, and the venues with the most
+    # upcoming shows. <rebuild> returns (venues, artists, counts) in the
+    # formats of RecentItems.replace/TopCounter.replace and runs on a
+    # background thread every <interval> seconds, never on a request
+
+    def __init__(self, rebuild, size=6, interval=300, first_wait=1.0):
+        self.recent = {
+            'venue': RecentItems(size),
+            'artist': RecentItems(size),
+        }
+        self.busiest_venues = TopCounter(size)
+        self.rebuilt_at = None
+        self.interval = interval
+        self.first_wait = first_wait
+        self._rebuild = rebuild
+        self._thread = None
+        self._lock = threading.Lock()
+        self._first_done = threading.Event()
+        # changes made while a rebuild reads the database, replayed on top
+        # of what it read so a rebuild cannot undo them. a show booked
+        # while the counts are read may be counted twice until the next
+        # rebuild, within TopCounter's error anyway
+        self._changes_lock = threading.Lock()
+        self._changes_during_rebuild = None
+
+    def listed(self, kind, item_id, name):
+        self._change(self.recent[kind].add, item_id, name)
+
+    def renamed(self, kind, item_id, name):
+        self._change(self.recent[kind].rename, item_id, name)
+        if kind == 'venue':
+            self._change(self.busiest_venues.rename, item_id, name)
+
+    def show_booked(self, venue_id, venue_name):
+        self._change(self.busiest_venues.add, venue_id, venue_name)
+
+    def _change(self, apply, *args):
+        with self._changes_lock:
+            if self._changes_during_rebuild is not None:
+                self._changes_during_rebuild.append((apply, args))
+            apply(*args)
+
+    def rebuild(self):
+        with self._changes_lock:
+            self._changes_during_rebuild = []
+        try:
+            venues, artists, counts = self._rebuild()
+        except Exception:
+            with self._changes_lock:
+                self._changes_during_rebuild = None
+            raise
+        with self._changes_lock:
+            self.recent['venue'].replace(venues)
+            self.recent['artist'].replace(artists)
+            self.busiest_venues.replace(counts)
+            for apply, args in self._changes_during_rebuild:
+                apply(*args)
+            self._changes_during_rebuild = None
+        self.rebuilt_at = time.time()
+
+    def snapshot(self):
+        # what the homepage renders. gunicorn workers start the periodic
+        # rebuild before taking requests (gunicorn_config.post_worker_init);
+        # otherwise the first call starts it and waits up to <first_wait>
+        # seconds for its first run. the panels stay empty until a rebuild
+        # succeeds
+        if self._thread is None:
+            self.start()
+            self._first_done.wait(self.first_wait)
+        return {
+            "recent_venues": self.recent['venue'].items(),
+            "recent_artists": self.recent['artist'].items(),
+            "busiest_venues": self.busiest_venues.top(),
+        }
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='home-panels', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.rebuild()
+            except Exception:
+                # keep serving the incrementally maintained panels
+                logger.exception('rebuilding the home panels failed')
+            finally:
+                self._first_done.set()
+            time.sleep(self.interval)